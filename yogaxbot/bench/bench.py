@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Офлайн-бенчмарк YogaX Bot: фейковий Bot API + синтетична база користувачів.
+
+    python bench/bench.py --users 20000 --latency 0.02 --retry-rate 0.001 --blocked-rate 0.05
+
+Результати (пропускна здатність, p50/p95/p99, SQL-запити, виклики API) пишуться
+в JSON (--output), щоб порівнювати прогони до і після змін.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+SCENARIOS = ('texts', 'start', 'onboarding', 'trial_maintenance', 'reminders', 'purge', 'broadcast')
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description='Офлайн-бенчмарк YogaX Bot')
+    p.add_argument('--database-url', default='sqlite:///bench.db',
+                   help='окрема БД для бенчмарку; SQLite-файл перестворюється, інші БД очищуються')
+    p.add_argument('--users', type=int, default=5000)
+    p.add_argument('--messages-per-user', type=int, default=6, help='workout_messages на користувача з тріалом')
+    p.add_argument('--catalog', type=int, default=12, help='рядків у workout_catalogs')
+    p.add_argument('--start-updates', type=int, default=500, help='кількість /start від нових користувачів')
+    p.add_argument('--start-concurrency', type=int, default=50)
+    p.add_argument('--text-lookups', type=int, default=100000)
+    p.add_argument('--latency', type=float, default=0.0, help='затримка кожного виклику API, сек')
+    p.add_argument('--jitter', type=float, default=0.0, help='додаткова випадкова затримка 0..jitter, сек')
+    p.add_argument('--retry-rate', type=float, default=0.0, help='частка викликів, що отримують 429')
+    p.add_argument('--retry-after', type=int, default=1)
+    p.add_argument('--blocked-rate', type=float, default=0.0, help='частка користувачів, що заблокували бота')
+    p.add_argument('--scenarios', default=','.join(SCENARIOS))
+    p.add_argument('--seed', type=int, default=1)
+    p.add_argument('--output', default='bench_results.json')
+    p.add_argument('--verbose', action='store_true')
+    return p.parse_args()
+
+
+ARGS = parse_args()
+os.environ['DATABASE_URL'] = ARGS.database_url
+os.environ.setdefault('DB_AUTO_MIGRATE', '1')
+# ліміти відправки за замовчуванням зняті, щоб міряти сам код;
+# щоб виміряти з продакшн-лімітами, задайте змінні явно
+for _name in ('OUTBOUND_RATE', 'OUTBOUND_BURST', 'OUTBOUND_CHAT_RATE', 'OUTBOUND_CHAT_BURST'):
+    os.environ.setdefault(_name, '1000000')
+sys.path.insert(0, ROOT)
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Chat, Message, Update, User as TgUser
+from sqlalchemy import delete, insert, update
+
+import db
+import metrics
+from db import SessionLocal, User, WorkoutMessage, WorkoutCatalog, DelayedTask
+from fake_api import FakeTelegramSession
+
+logger = logging.getLogger('bench')
+
+USER_ID_BASE = 10_000_000
+NEW_USER_ID_BASE = 20_000_000
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {'p50_ms': pick(0.50) * 1000, 'p95_ms': pick(0.95) * 1000, 'p99_ms': pick(0.99) * 1000,
+            'max_ms': ordered[-1] * 1000}
+
+
+def db_queries() -> int:
+    series = metrics.db_query_seconds.values.get(())
+    return series[2] if series else 0
+
+
+async def reset_database() -> None:
+    if db.engine.url.get_backend_name() == 'sqlite':
+        path = db.engine.url.database
+        if path and os.path.exists(path):
+            os.remove(path)
+        await db.init_db()
+        return
+    await db.init_db()
+    async with SessionLocal() as session:
+        for model in (db.BroadcastDelivery, db.BroadcastLog, DelayedTask, WorkoutMessage, User, WorkoutCatalog):
+            await session.execute(delete(model))
+        await session.commit()
+
+
+async def seed(rnd: random.Random) -> dict:
+    """Користувачі в різних станах тріалу, їхні workout_messages і каталог."""
+    now = datetime.utcnow()
+    users, messages = [], []
+    counts = Counter()
+    message_id = 1
+    for i in range(ARGS.users):
+        user_id = USER_ID_BASE + i
+        roll = rnd.random()
+        if roll < 0.40:
+            # тріал активний, нагадування вже настало
+            status, started, reminded = 'trial_active', now - timedelta(days=5), now - timedelta(days=4)
+        elif roll < 0.60:
+            status, started, reminded = 'trial_active', now - timedelta(days=1), now - timedelta(days=1)
+        elif roll < 0.65:
+            # тріал скінчився, але статус ще не оновлено
+            status, started, reminded = 'trial_active', now - timedelta(days=16), now - timedelta(days=2)
+        elif roll < 0.90:
+            status, started, reminded = 'trial_expired', now - timedelta(days=20), now - timedelta(days=8)
+        else:
+            status, started, reminded = 'new', None, None
+        counts[status] += 1
+        users.append({'user_id': user_id, 'status': status, 'trial_started_at': started,
+                      'trial_expires_at': started + timedelta(days=15) if started else None,
+                      'last_reminder_at': reminded, 'extension_used': False, 'blocked': False,
+                      'next_reminder_at': reminded + timedelta(days=3) if status == 'trial_active' else None})
+        if started:
+            for _ in range(ARGS.messages_per_user):
+                messages.append({'user_id': user_id, 'chat_id': user_id, 'message_id': message_id, 'created_at': started})
+                message_id += 1
+    catalog = [{'code': f'bench_{n}', 'caption': f'Бенчмарк-тренування {n}', 'url': f'https://example.com/w/{n}',
+                'photo_file_id': f'bench-photo-{n}', 'is_active': True} for n in range(ARGS.catalog)]
+
+    chunk = 1000
+    async with SessionLocal() as session:
+        for rows, model in ((users, User), (messages, WorkoutMessage)):
+            for i in range(0, len(rows), chunk):
+                await session.execute(insert(model), rows[i:i + chunk])
+        if catalog:
+            await session.execute(delete(WorkoutCatalog))
+            await session.execute(insert(WorkoutCatalog), catalog)
+        await session.commit()
+    return {'users': dict(counts), 'workout_messages': len(messages), 'catalog': len(catalog)}
+
+
+def start_update(n: int) -> Update:
+    user_id = NEW_USER_ID_BASE + n
+    return Update(update_id=n + 1, message=Message(
+        message_id=n + 1, date=datetime.now(), chat=Chat(id=user_id, type='private'),
+        from_user=TgUser(id=user_id, is_bot=False, first_name='bench'), text='/start'))
+
+
+class Scenario:
+    """Знімає час, SQL-запити і виклики API за один сценарій."""
+
+    def __init__(self, session: FakeTelegramSession, name: str):
+        self.session, self.name = session, name
+        self.samples = []
+        self.items = 0
+        self.failed = Counter()
+
+    async def __aenter__(self):
+        self._calls = len(self.session.calls)
+        self._errors = Counter(self.session.errors)
+        self._queries = db_queries()
+        self._started = time.perf_counter()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.seconds = time.perf_counter() - self._started
+        self.queries = db_queries() - self._queries
+        self.api_calls = Counter(m.__api_method__ for m in self.session.calls[self._calls:])
+        self.api_errors = Counter(self.session.errors) - self._errors
+        return False
+
+    def result(self) -> dict:
+        out = {'items': self.items, 'seconds': round(self.seconds, 4),
+               'throughput_per_s': round(self.items / self.seconds, 1) if self.seconds else None,
+               'db_queries': self.queries,
+               'db_queries_per_item': round(self.queries / self.items, 2) if self.items else None,
+               'api_calls': dict(self.api_calls), 'api_errors': dict(self.api_errors)}
+        if self.failed:
+            out['failed'] = dict(self.failed)
+        out.update({k: round(v, 3) for k, v in percentiles(self.samples).items()})
+        return out
+
+
+async def bench_texts(session):
+    async with Scenario(session, 'texts') as sc:
+        db.invalidate_texts()
+        keys = list(db.DEFAULT_TEXTS)
+        for i in range(ARGS.text_lookups):
+            t0 = time.perf_counter()
+            await db.T(keys[i % len(keys)], days_left=3)
+            sc.samples.append(time.perf_counter() - t0)
+        sc.items = ARGS.text_lookups
+    return sc
+
+
+async def bench_start(session, bot, dp):
+    sem = asyncio.Semaphore(ARGS.start_concurrency)
+
+    async def feed(n):
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                await dp.feed_update(bot, start_update(n))
+            except Exception as e:
+                # у проді помилку хендлера лише логує aiogram — тут рахуємо її
+                sc.failed[type(e).__name__] += 1
+            sc.samples.append(time.perf_counter() - t0)
+
+    async with Scenario(session, 'start') as sc:
+        await asyncio.gather(*(feed(n) for n in range(ARGS.start_updates)))
+        sc.items = ARGS.start_updates
+    return sc
+
+
+async def bench_onboarding(session, bot):
+    from delayed_tasks import dispatch_delayed_tasks
+    # відкладений старт курсу після /start — робимо його «настав» одразу
+    async with SessionLocal() as s:
+        await s.execute(update(DelayedTask).values(run_at=datetime.utcnow() - timedelta(seconds=1)))
+        await s.commit()
+    async with Scenario(session, 'onboarding') as sc:
+        while True:
+            t0 = time.perf_counter()
+            n = await dispatch_delayed_tasks(bot)
+            if not n:
+                break
+            sc.samples.append(time.perf_counter() - t0)
+            sc.items += n
+    return sc
+
+
+async def bench_job(session, bot, name, job, loop_until_empty=False):
+    async with Scenario(session, name) as sc:
+        while True:
+            t0 = time.perf_counter()
+            n = await job(bot)
+            sc.samples.append(time.perf_counter() - t0)
+            sc.items += n or 0
+            if not loop_until_empty or not n:
+                break
+    return sc
+
+
+async def bench_broadcast(session, bot):
+    import broadcaster
+    async with Scenario(session, 'broadcast') as sc:
+        log_id, total = await broadcaster.start_broadcast(bot, 'text', text='Бенчмарк-розсилка')
+        task = broadcaster._running.get(log_id)
+        if task is not None:
+            await task
+        sc.items = total
+    return sc
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+async def main():
+    logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s',
+                        level=logging.INFO if ARGS.verbose else logging.WARNING)
+    rnd = random.Random(ARGS.seed)
+    scenarios = [s.strip() for s in ARGS.scenarios.split(',') if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f'невідомі сценарії: {", ".join(sorted(unknown))}')
+
+    await reset_database()
+    t0 = time.perf_counter()
+    seeded = await seed(rnd)
+    seed_seconds = time.perf_counter() - t0
+
+    blocked = {USER_ID_BASE + i for i in range(ARGS.users) if rnd.random() < ARGS.blocked_rate}
+    blocked |= {NEW_USER_ID_BASE + i for i in range(ARGS.start_updates) if rnd.random() < ARGS.blocked_rate}
+    session = FakeTelegramSession(latency=ARGS.latency, jitter=ARGS.jitter, retry_after_rate=ARGS.retry_rate,
+                                  retry_after=ARGS.retry_after, blocked=blocked, seed=ARGS.seed)
+    bot = Bot('42:BENCH', session=session)
+    from blocked import BlockedTrackingMiddleware, flush_blocked
+    bot.session.middleware(BlockedTrackingMiddleware())
+    from outbound import setup_outbound
+    setup_outbound(bot)
+
+    from handlers import router
+    from handlers.tasks import trial_maintenance, send_reminders, purge_workouts
+    from fsm_storage import SQLAlchemyStorage
+    from catalog import reload_catalog
+    dp = Dispatcher(storage=SQLAlchemyStorage())
+    dp.include_router(router)
+    metrics.setup_metrics(dp, bot, db.engine)
+    dp.update.outer_middleware.register(db.session_middleware)
+    await reload_catalog()
+
+    results = {}
+    for name in scenarios:
+        logger.warning("running %s", name)
+        if name == 'texts':
+            sc = await bench_texts(session)
+        elif name == 'start':
+            sc = await bench_start(session, bot, dp)
+        elif name == 'onboarding':
+            sc = await bench_onboarding(session, bot)
+        elif name == 'trial_maintenance':
+            sc = await bench_job(session, bot, name, trial_maintenance)
+        elif name == 'reminders':
+            # тік за тіком, поки не розішлемо всі нагадування, що настали
+            sc = await bench_job(session, bot, name, send_reminders, loop_until_empty=True)
+        elif name == 'purge':
+            sc = await bench_job(session, bot, name, purge_workouts, loop_until_empty=True)
+        else:
+            sc = await bench_broadcast(session, bot)
+        results[name] = sc.result()
+        # позначки «заблокував бота» пишуться батчами — наступний сценарій уже їх бачить
+        await flush_blocked()
+
+    report = {
+        'created_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'database': db.engine.url.get_backend_name(),
+        'params': {k: v for k, v in vars(ARGS).items() if k not in ('output', 'verbose')},
+        'seed': dict(seeded, seconds=round(seed_seconds, 3), blocked=len(blocked)),
+        'scenarios': results,
+    }
+    await bot.session.close()
+    await db.engine.dispose()
+    with open(ARGS.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    for name, r in results.items():
+        print(f"{name:18} {r['items']:>8} items {r['seconds']:>9.3f}s "
+              f"{r['throughput_per_s'] or 0:>10}/s p95={r.get('p95_ms', 0):.1f}ms sql={r['db_queries']}")
+    print(f'results -> {ARGS.output}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Відтворення записаних апдейтів (capture.py, UPDATE_CAPTURE_PATH) проти фейкового Bot API
+і окремої БД — тим самим Dispatcher, що й у продакшні (main.create_dispatcher).
+
+    python bench/replay.py updates.jsonl --speed 10 --latency 0.05
+
+--speed задає прискорення відносно записаних інтервалів (0 — без пауз, усе одразу).
+Ліміти відправки (OUTBOUND_*) — продакшн-значення, якщо не задані явно. Звіт
+(p50/p95/p99 за хендлером, SQL-запити на апдейт, виклики API) пишеться в JSON (--output).
+"""
+
+import argparse
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import platform
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description='Відтворення записаних апдейтів YogaX Bot')
+    p.add_argument('input', help='JSONL, записаний через UPDATE_CAPTURE_PATH')
+    p.add_argument('--database-url', default='sqlite:///replay.db',
+                   help='окрема БД; SQLite-файл перестворюється, інші БД очищуються')
+    p.add_argument('--speed', type=float, default=1.0, help='прискорення відносно запису; 0 — без пауз')
+    p.add_argument('--limit', type=int, default=0, help='відтворити лише перші N апдейтів')
+    p.add_argument('--latency', type=float, default=0.0, help='затримка кожного виклику API, сек')
+    p.add_argument('--jitter', type=float, default=0.0, help='додаткова випадкова затримка 0..jitter, сек')
+    p.add_argument('--retry-rate', type=float, default=0.0, help='частка викликів, що отримують 429')
+    p.add_argument('--retry-after', type=int, default=1)
+    p.add_argument('--seed', type=int, default=1)
+    p.add_argument('--output', default='replay_results.json')
+    p.add_argument('--verbose', action='store_true')
+    return p.parse_args()
+
+
+ARGS = parse_args()
+os.environ['DATABASE_URL'] = ARGS.database_url
+os.environ.setdefault('DB_AUTO_MIGRATE', '1')
+os.environ.setdefault('BOT_TOKEN', '42:REPLAY')
+# відтворення не пише нового запису
+os.environ['UPDATE_CAPTURE_PATH'] = ''
+sys.path.insert(0, ROOT)
+logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s',
+                    level=logging.INFO if ARGS.verbose else logging.WARNING)
+
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.enums import ParseMode
+from aiogram.types import Update
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from sqlalchemy import delete
+
+import db
+import metrics
+from fake_api import FakeTelegramSession
+
+logger = logging.getLogger('replay')
+
+# статистика апдейту (metrics.UpdateStats) для поточного feed_update
+_probe = contextvars.ContextVar('replay_probe')
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {'p50_ms': round(pick(0.50) * 1000, 3), 'p95_ms': round(pick(0.95) * 1000, 3),
+            'p99_ms': round(pick(0.99) * 1000, 3), 'max_ms': round(ordered[-1] * 1000, 3)}
+
+
+def load_records(path: str, limit: int = 0):
+    records = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+            if limit and len(records) >= limit:
+                break
+    records.sort(key=lambda r: r['ts'])
+    return records
+
+
+async def reset_database() -> None:
+    if db.engine.url.get_backend_name() == 'sqlite':
+        path = db.engine.url.database
+        if path and os.path.exists(path):
+            os.remove(path)
+        await db.init_db()
+    else:
+        await db.init_db()
+        async with db.SessionLocal() as session:
+            for model in (db.BroadcastDelivery, db.BroadcastLog, db.DelayedTask, db.WorkoutMessage,
+                          db.User, db.WorkoutCatalog, db.FsmState):
+                await session.execute(delete(model))
+            await session.commit()
+    await db.seed_free_workouts_if_empty()
+
+
+async def probe_middleware(handler, event, data):
+    # реєструється після setup_metrics — тут уже є UpdateStats поточного апдейту
+    holder = _probe.get(None)
+    if holder is not None:
+        holder['stats'] = metrics._current.get()
+    return await handler(event, data)
+
+
+async def main():
+    records = load_records(ARGS.input, ARGS.limit)
+    if not records:
+        raise SystemExit(f'{ARGS.input}: немає апдейтів')
+    await reset_database()
+
+    session = FakeTelegramSession(latency=ARGS.latency, jitter=ARGS.jitter, retry_after_rate=ARGS.retry_rate,
+                                  retry_after=ARGS.retry_after, seed=ARGS.seed)
+    bot = Bot('42:REPLAY', session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    from blocked import BlockedTrackingMiddleware, flush_blocked
+    bot.session.middleware(BlockedTrackingMiddleware())
+    from outbound import setup_outbound
+    setup_outbound(bot)
+    from main import create_dispatcher
+    from catalog import reload_catalog
+    dp = create_dispatcher(AsyncIOScheduler(), bot)
+    dp.update.outer_middleware.register(probe_middleware)
+    await reload_catalog()
+
+    latencies = defaultdict(list)
+    queries = defaultdict(list)
+    failed = Counter()
+    lateness = []
+
+    async def feed(record, due):
+        lateness.append(max(0.0, time.perf_counter() - due))
+        update = Update.model_validate(record['update'], context={'bot': bot})
+        holder = {}
+        _probe.set(holder)
+        t0 = time.perf_counter()
+        try:
+            await dp.feed_update(bot, update)
+        except Exception as e:
+            # у проді помилку хендлера лише логує aiogram — тут рахуємо її
+            failed[type(e).__name__] += 1
+        elapsed = time.perf_counter() - t0
+        stats = holder.get('stats')
+        name = stats.handler if stats is not None else 'filtered'
+        latencies[name].append(elapsed)
+        queries[name].append(stats.db_queries if stats is not None else 0)
+
+    first_ts = records[0]['ts']
+    started = time.perf_counter()
+    tasks = []
+    for record in records:
+        due = started + ((record['ts'] - first_ts) / ARGS.speed if ARGS.speed > 0 else 0)
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        # як у dp.start_polling(handle_as_tasks=True): апдейти обробляються паралельно
+        tasks.append(asyncio.create_task(feed(record, due)))
+    await asyncio.gather(*tasks)
+    seconds = time.perf_counter() - started
+    await flush_blocked()
+
+    all_latencies = [v for values in latencies.values() for v in values]
+    all_queries = [v for values in queries.values() for v in values]
+    report = {
+        'created_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'python': platform.python_version(),
+        'database': db.engine.url.get_backend_name(),
+        'params': {k: v for k, v in vars(ARGS).items() if k not in ('output', 'verbose')},
+        'updates': len(records),
+        'recorded_seconds': round(records[-1]['ts'] - first_ts, 3),
+        'seconds': round(seconds, 4),
+        'throughput_per_s': round(len(records) / seconds, 1) if seconds else None,
+        'latency': percentiles(all_latencies),
+        'db_queries_per_update': round(sum(all_queries) / len(all_queries), 2),
+        # наскільки пізніше за розклад апдейт потрапив у обробку (цикл подій не встигав)
+        'schedule_lag': percentiles(lateness),
+        'handlers': {
+            name: dict(count=len(values), db_queries_per_update=round(sum(queries[name]) / len(values), 2),
+                       **percentiles(values))
+            for name, values in sorted(latencies.items(), key=lambda kv: len(kv[1]), reverse=True)
+        },
+        'api_calls': dict(Counter(m.__api_method__ for m in session.calls).most_common()),
+        'api_errors': dict(session.errors),
+    }
+    if failed:
+        report['failed'] = dict(failed)
+    await bot.session.close()
+    await db.engine.dispose()
+    with open(ARGS.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    lat = report['latency']
+    print(f"{len(records)} updates in {seconds:.2f}s (recorded {report['recorded_seconds']}s, x{ARGS.speed}): "
+          f"p50={lat['p50_ms']:.1f}ms p95={lat['p95_ms']:.1f}ms p99={lat['p99_ms']:.1f}ms "
+          f"sql/update={report['db_queries_per_update']}")
+    for name, r in report['handlers'].items():
+        print(f"  {name:28} {r['count']:>6} p50={r['p50_ms']:.1f}ms p95={r['p95_ms']:.1f}ms "
+              f"p99={r['p99_ms']:.1f}ms sql={r['db_queries_per_update']}")
+    print('  api: ' + ', '.join(f'{k}={v}' for k, v in report['api_calls'].items()))
+    print(f'results -> {ARGS.output}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import os
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.methods import TelegramMethod
+from sqlalchemy import update
+from db import SessionLocal, User
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Позначки «заблокував бота» накопичуються в пам'яті і пишуться в БД одним UPDATE:
+# коли набралось BLOCKED_BATCH_SIZE або раз на BLOCKED_FLUSH_INTERVAL секунд (планувальник).
+BLOCKED_BATCH_SIZE = int(os.getenv('BLOCKED_BATCH_SIZE', '200'))
+BLOCKED_FLUSH_INTERVAL = int(os.getenv('BLOCKED_FLUSH_INTERVAL', '30'))
+
+_pending = set()
+_flush_lock = asyncio.Lock()
+_flush_task = None
+
+
+def is_dead_chat_error(error: Exception) -> bool:
+    """Чат більше недоступний: бота заблокували, акаунт видалено або чату не існує."""
+    if isinstance(error, TelegramForbiddenError):
+        return True
+    return isinstance(error, TelegramBadRequest) and 'chat not found' in error.message.lower()
+
+
+def mark_blocked(user_id: int) -> None:
+    global _flush_task
+    _pending.add(int(user_id))
+    if len(_pending) >= BLOCKED_BATCH_SIZE and (_flush_task is None or _flush_task.done()):
+        _flush_task = asyncio.create_task(flush_blocked())
+
+
+def unmark_blocked(user_id: int) -> None:
+    # користувач знову написав боту — ще не записана позначка вже неактуальна
+    _pending.discard(int(user_id))
+
+
+async def flush_blocked() -> int:
+    """Записує накопичені позначки в users.blocked; повертає кількість user_id у батчі."""
+    global _pending
+    async with _flush_lock:
+        if not _pending:
+            return 0
+        batch, _pending = _pending, set()
+        try:
+            async with SessionLocal() as session:
+                await session.execute(update(User).where(User.user_id.in_(batch), User.blocked == False)
+                                      .values(blocked=True))
+                await session.commit()
+        except Exception:
+            _pending |= batch
+            raise
+    metrics.blocked_marked.inc(len(batch))
+    logger.info("blocked users marked: %s", len(batch))
+    return len(batch)
+
+
+class BlockedTrackingMiddleware(BaseRequestMiddleware):
+    """Middleware сесії бота: будь-який шлях відправки, що отримав Forbidden / chat not found, позначає користувача."""
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod):
+        try:
+            return await make_request(bot, method)
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            chat_id = getattr(method, 'chat_id', None)
+            # лише приватні чати: у них chat_id == user_id
+            if isinstance(chat_id, int) and chat_id > 0 and is_dead_chat_error(e):
+                mark_blocked(chat_id)
+            raise
@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError
+from sqlalchemy import insert, select, update, exists, or_, and_
+from db import SessionLocal, User, BroadcastLog, BroadcastDelivery, iter_users
+from ratelimit import run_limited
+from outbound import Priority, priority
+import stats
+
+logger = logging.getLogger(__name__)
+
+# --- Налаштування розсилки ---
+# темп відправки задає спільна черга outbound (пріоритет BULK)
+BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', '20'))
+BROADCAST_BATCH_SIZE = int(os.getenv('BROADCAST_BATCH_SIZE', '200'))
+# оренда батча: поки воркер відправляє, він продовжує її кожну третину строку; якщо воркер
+# упав, його рядки 'sending' повернуться в чергу вже за BROADCAST_LEASE секунд
+BROADCAST_LEASE = timedelta(seconds=int(os.getenv('BROADCAST_LEASE', '30')))
+
+# log_id -> asyncio.Task, щоб одна розсилка не мала двох воркерів
+_running = {}
+
+
+def _claimable(log_id: int, now: datetime):
+    return and_(BroadcastDelivery.broadcast_id == log_id, or_(
+        BroadcastDelivery.status == 'pending',
+        and_(BroadcastDelivery.status == 'sending', BroadcastDelivery.updated_at < now - BROADCAST_LEASE),
+    ))
+
+
+async def _claim_batch(log_id: int):
+    # як і delayed_tasks: батч забирається одним UPDATE ... RETURNING зі статусом 'sending',
+    # тож другий воркер (або той самий після рестарту) не надішле тим самим одержувачам
+    now = datetime.utcnow()
+    due = (select(BroadcastDelivery.id).where(_claimable(log_id, now))
+           .order_by(BroadcastDelivery.id).limit(BROADCAST_BATCH_SIZE))
+    stmt = (
+        update(BroadcastDelivery)
+        .where(BroadcastDelivery.id.in_(due.scalar_subquery()), _claimable(log_id, now))
+        .values(status='sending', updated_at=now)
+        .returning(BroadcastDelivery.id, BroadcastDelivery.user_id)
+    )
+    async with SessionLocal() as session:
+        rows = (await session.execute(stmt)).all()
+        await session.commit()
+    return sorted(rows, key=lambda r: r.id)
+
+
+async def _renew_lease(ids) -> None:
+    while True:
+        await asyncio.sleep(BROADCAST_LEASE.total_seconds() / 3)
+        async with SessionLocal() as session:
+            await session.execute(update(BroadcastDelivery).where(
+                BroadcastDelivery.id.in_(ids), BroadcastDelivery.status == 'sending',
+            ).values(updated_at=datetime.utcnow()))
+            await session.commit()
+
+
+async def _leased_elsewhere(log_id: int) -> bool:
+    # батчі, які ще відправляє інший воркер (оренда не минула)
+    async with SessionLocal() as session:
+        return bool(await session.scalar(select(exists().where(
+            BroadcastDelivery.broadcast_id == log_id, BroadcastDelivery.status == 'sending'))))
+
+
+async def _checkpoint(log_id: int, results) -> None:
+    # один коміт на батч: статуси одержувачів + лічильники розсилки
+    now = datetime.utcnow()
+    sent = sum(1 for r in results if r['status'] == 'sent')
+    async with SessionLocal() as session:
+        await session.execute(update(BroadcastDelivery), [dict(r, updated_at=now) for r in results])
+        await session.execute(update(BroadcastLog).where(BroadcastLog.id == log_id).values(
+            status='running',
+            success=BroadcastLog.success + sent,
+            failed=BroadcastLog.failed + (len(results) - sent),
+        ))
+        await stats.bump(session, 'broadcast_sent', sent)
+        await stats.bump(session, 'broadcast_failed', len(results) - sent)
+        await session.commit()
+
+
+async def _send_batch(bot: Bot, log: dict, batch):
+    async def send(row):
+        if log['kind'] == 'photo':
+            await bot.send_photo(row.user_id, log['photo_file_id'], caption=log['payload'], protect_content=True)
+        else:
+            await bot.send_message(row.user_id, log['payload'], protect_content=True)
+
+    results = []
+    with priority(Priority.BULK):
+        outcomes = await run_limited(batch, send, BROADCAST_CONCURRENCY)
+    for row, outcome in outcomes:
+        if not isinstance(outcome, Exception):
+            results.append({'id': row.id, 'status': 'sent', 'error': None})
+        elif isinstance(outcome, TelegramForbiddenError):
+            results.append({'id': row.id, 'status': 'blocked', 'error': str(outcome)[:200]})
+        else:
+            logger.warning("broadcast_%s failed to user_id=%s err=%s", log['kind'], row.user_id, outcome)
+            results.append({'id': row.id, 'status': 'failed', 'error': str(outcome)[:200]})
+    return results
+
+
+async def run_broadcast(bot: Bot, log_id: int) -> None:
+    async with SessionLocal() as session:
+        row = await session.get(BroadcastLog, log_id)
+        if row is None or row.status == 'done':
+            return
+        log = {'kind': row.kind, 'payload': row.payload, 'photo_file_id': row.photo_file_id,
+               'admin_chat_id': row.admin_chat_id}
+
+    started = time.monotonic()
+    while True:
+        batch = await _claim_batch(log_id)
+        if batch:
+            renew = asyncio.create_task(_renew_lease([r.id for r in batch]))
+            try:
+                results = await _send_batch(bot, log, batch)
+            finally:
+                renew.cancel()
+            await _checkpoint(log_id, results)
+        elif await _leased_elsewhere(log_id):
+            # чекаємо, поки інший воркер закінчить, або його оренда мине
+            await asyncio.sleep(BROADCAST_LEASE.total_seconds() / 3)
+        else:
+            break
+
+    async with SessionLocal() as session:
+        # завершує (і звітує адміну) лише один воркер
+        result = await session.execute(
+            update(BroadcastLog).where(BroadcastLog.id == log_id, BroadcastLog.status != 'done')
+            .values(status='done', finished_at=datetime.utcnow()))
+        await session.commit()
+        if not result.rowcount:
+            return
+        row = await session.get(BroadcastLog, log_id)
+        success, failed = row.success, row.failed
+    logger.info("broadcast log_id=%s done in %.1fs success=%s failed=%s",
+                log_id, time.monotonic() - started, success, failed)
+    await _notify_admin(bot, log['admin_chat_id'],
+                        f'Розсилку #{log_id} завершено. Успішно: {success}, помилок: {failed}')
+
+
+async def _notify_admin(bot: Bot, chat_id, text: str) -> None:
+    if not chat_id:
+        return
+    try:
+        await bot.send_message(chat_id, text)
+    except Exception as e:
+        logger.warning("broadcast report to admin failed: %s", e)
+
+
+async def _run_guarded(bot: Bot, log_id: int) -> None:
+    # фонова задача: без цього виняток лишився б у Task і ніхто б про нього не дізнався
+    try:
+        await run_broadcast(bot, log_id)
+    except Exception as e:
+        logger.exception("broadcast log_id=%s stopped with error", log_id)
+        try:
+            async with SessionLocal() as session:
+                chat_id = await session.scalar(select(BroadcastLog.admin_chat_id).where(BroadcastLog.id == log_id))
+        except Exception:
+            return
+        await _notify_admin(bot, chat_id, f'Розсилка #{log_id} зупинилась через помилку: {type(e).__name__}. '
+                                          f'Решту буде надіслано після перезапуску бота.')
+
+
+def _spawn(bot: Bot, log_id: int) -> None:
+    if log_id in _running:
+        return
+    task = asyncio.create_task(_run_guarded(bot, log_id))
+    _running[log_id] = task
+    task.add_done_callback(lambda t: _running.pop(log_id, None))
+
+
+async def start_broadcast(bot: Bot, kind: str, text: str = None, photo: str = None,
+                    admin_chat_id: int = None):
+    """Зберігає розсилку як задачу з рядком на кожного одержувача і запускає її у фоні.
+
+    Повертає (id запису BroadcastLog, кількість одержувачів).
+    """
+    async with SessionLocal() as session:
+        log = BroadcastLog(kind=kind, payload_preview=(text or '')[:100], payload=text, photo_file_id=photo,
+                           admin_chat_id=admin_chat_id, status='pending', total=0, success=0, failed=0)
+        session.add(log)
+        await session.flush()
+        total = 0
+        async for rows in iter_users(filters=(User.blocked == False,), session=session):
+            await session.execute(insert(BroadcastDelivery), [{'broadcast_id': log.id, 'user_id': r.user_id} for r in rows])
+            total += len(rows)
+        log.total = total
+        await stats.bump(session, 'broadcasts')
+        await session.commit()
+        log_id = log.id
+    _spawn(bot, log_id)
+    return log_id, total
+
+
+async def resume_broadcasts(bot: Bot) -> None:
+    """Після рестарту продовжує незавершені розсилки з місця зупинки."""
+    async with SessionLocal() as session:
+        result = await session.execute(
+            select(BroadcastLog.id).where(BroadcastLog.status.in_(('pending', 'running'))))
+        log_ids = result.scalars().all()
+    for log_id in log_ids:
+        logger.info("resuming broadcast log_id=%s", log_id)
+        _spawn(bot, log_id)
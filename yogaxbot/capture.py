@@ -0,0 +1,131 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import time
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+# Запис вхідних апдейтів у JSONL для відтворення навантаження (bench/replay.py).
+# Дані знеособлюються ще до запису: id користувачів і чатів замінюються стабільними
+# псевдонімами (HMAC з сіллю), імена й довільний текст — заглушками; команди, кнопки меню
+# і callback_data лишаються, щоб апдейти при відтворенні потрапили в ті самі хендлери.
+UPDATE_CAPTURE_PATH = os.getenv('UPDATE_CAPTURE_PATH', '')
+UPDATE_CAPTURE_SALT = os.getenv('UPDATE_CAPTURE_SALT', '')
+UPDATE_CAPTURE_SAMPLE = float(os.getenv('UPDATE_CAPTURE_SAMPLE', '1'))
+UPDATE_CAPTURE_FLUSH = int(os.getenv('UPDATE_CAPTURE_FLUSH', '100'))
+UPDATE_CAPTURE_FLUSH_INTERVAL = float(os.getenv('UPDATE_CAPTURE_FLUSH_INTERVAL', '10'))
+
+# об'єкти, чиє поле id — це користувач або чат
+_ID_PARENTS = {'from', 'chat', 'user', 'sender_chat', 'forward_from', 'forward_from_chat', 'via_bot',
+               'new_chat_members', 'left_chat_member', 'chat_shared', 'users_shared'}
+_ID_KEYS = {'user_id', 'chat_id'}
+_DROP_KEYS = {'last_name', 'username', 'phone_number', 'bio', 'title', 'invite_link', 'vcard',
+              'location', 'venue', 'contact'}
+_TEXT_KEYS = {'text', 'caption', 'query'}
+_FILE_KEYS = {'file_id', 'file_unique_id'}
+
+
+def _pseudonym(value: int, salt: bytes) -> int:
+    digest = hmac.new(salt, str(abs(value)).encode(), hashlib.sha256).digest()
+    alias = int.from_bytes(digest[:4], 'big') % 2_000_000_000 + 1
+    # знак зберігаємо: від'ємні id — групи й канали
+    return -alias if value < 0 else alias
+
+
+def _scrub_text(text: str, keep: set) -> str:
+    if text in keep:
+        return text
+    if text.startswith('/'):
+        # лише сама команда, без аргументів (deep-link, введені дані)
+        return text.split()[0]
+    return 'x' * len(text)
+
+
+def anonymize(data, salt: bytes, keep: set, parent: str = None):
+    """Знеособлює результат Update.model_dump(mode='json', by_alias=True)."""
+    if isinstance(data, list):
+        return [anonymize(item, salt, keep, parent) for item in data]
+    if not isinstance(data, dict):
+        return data
+    out = {}
+    for key, value in data.items():
+        if key in _DROP_KEYS:
+            continue
+        if (key == 'id' and parent in _ID_PARENTS or key in _ID_KEYS) and isinstance(value, int):
+            out[key] = _pseudonym(value, salt)
+        elif key == 'first_name':
+            out[key] = 'user'
+        elif key in _TEXT_KEYS and isinstance(value, str):
+            out[key] = _scrub_text(value, keep)
+        elif key in _FILE_KEYS:
+            out[key] = 'captured'
+        else:
+            out[key] = anonymize(value, salt, keep, key)
+    return out
+
+
+def _menu_texts() -> set:
+    # усі тексти кнопок, на які є хендлери, а не лише ті, що зараз у головній клавіатурі
+    from handlers.common import BUTTON_TEXTS
+    return set(BUTTON_TEXTS)
+
+
+class UpdateCapture:
+    """Зовнішній middleware апдейтів: пише знеособлені апдейти в JSONL батчами, поза циклом подій."""
+
+    def __init__(self, path: str, salt: str = UPDATE_CAPTURE_SALT, sample: float = UPDATE_CAPTURE_SAMPLE):
+        self.path = path
+        # без солі — випадкова на кожен запуск: псевдоніми стабільні лише в межах одного файлу
+        self.salt = (salt or os.urandom(16).hex()).encode()
+        self.sample = sample
+        self.keep = _menu_texts()
+        self._buffer = []
+        self._flushed_at = time.monotonic()
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    async def __call__(self, handler, event: Update, data):
+        if self.sample >= 1 or random.random() < self.sample:
+            try:
+                record = {'ts': round(time.time(), 3), 'update': anonymize(
+                    event.model_dump(mode='json', by_alias=True, exclude_none=True), self.salt, self.keep)}
+                self._buffer.append(json.dumps(record, ensure_ascii=False))
+            except Exception as e:
+                logger.warning("update capture failed: %s", e)
+            due = (len(self._buffer) >= UPDATE_CAPTURE_FLUSH
+                   or time.monotonic() - self._flushed_at >= UPDATE_CAPTURE_FLUSH_INTERVAL)
+            if due and (self._task is None or self._task.done()):
+                self._task = asyncio.create_task(self.flush())
+        return await handler(event, data)
+
+    def _write(self, lines) -> None:
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    async def flush(self) -> int:
+        async with self._lock:
+            lines, self._buffer = self._buffer, []
+            self._flushed_at = time.monotonic()
+            if lines:
+                try:
+                    await asyncio.to_thread(self._write, lines)
+                except OSError as e:
+                    logger.warning("update capture write to %s failed: %s", self.path, e)
+                    return 0
+        return len(lines)
+
+
+def setup_capture(dp):
+    """Вмикає запис апдейтів, якщо задано UPDATE_CAPTURE_PATH. Реєструвати першим middleware."""
+    if not UPDATE_CAPTURE_PATH:
+        return None
+    capture = UpdateCapture(UPDATE_CAPTURE_PATH)
+    dp.update.outer_middleware.register(capture)
+    dp.shutdown.register(capture.flush)
+    logger.info("Capturing updates to %s (sample=%s)", UPDATE_CAPTURE_PATH, capture.sample)
+    return capture
@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Collection, List, Optional, Tuple
+from aiogram import Bot
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, InputMediaPhoto, FSInputFile
+from sqlalchemy import select, update
+from db import SessionLocal, WorkoutCatalog, T
+
+logger = logging.getLogger(__name__)
+
+# Знімок активних тренувань живе в пам'яті; адмінка підміняє його після змін,
+# TTL — запасний варіант, коли каталог змінили в іншому процесі.
+CATALOG_CACHE_TTL = float(os.getenv('CATALOG_CACHE_TTL', '300'))
+ONBOARDING_WORKOUTS = 6
+# messages — кожне тренування окремим повідомленням (як раніше);
+# album — фото одним альбомом + одне повідомлення з кнопками-посиланнями
+ONBOARDING_DELIVERY = os.getenv('ONBOARDING_DELIVERY', 'messages')
+MEDIA_GROUP_LIMIT = 10
+
+
+def photo_input(value: str):
+    """Повертає (що передати в send_photo, чи треба після відправки зберегти file_id).
+
+    Фото може бути задане як file_id, URL або шлях до файлу; два останні Telegram
+    завантажує щоразу заново, тож після першої відправки їх варто замінити на file_id.
+    """
+    if value.startswith(('http://', 'https://')):
+        return value, True
+    if os.path.isfile(value):
+        return FSInputFile(value), True
+    return value, False
+
+
+@dataclass(frozen=True)
+class CatalogItem:
+    id: int
+    code: str
+    caption: str
+    url: Optional[str]
+    photo_file_id: Optional[str]
+    reply_markup: Optional[InlineKeyboardMarkup]
+
+    async def send(self, bot: Bot, chat_id: int):
+        if self.photo_file_id:
+            photo, uploaded = photo_input(self.photo_file_id)
+            msg = await bot.send_photo(chat_id, photo, caption=self.caption,
+                                       reply_markup=self.reply_markup, protect_content=True)
+            if uploaded:
+                await remember_photo_file_id(self.id, msg.photo[-1].file_id)
+            return msg
+        return await bot.send_message(chat_id, self.caption, reply_markup=self.reply_markup, protect_content=True)
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    version: int
+    items: Tuple[CatalogItem, ...]
+    loaded_at: float
+    # заготовки для ONBOARDING_DELIVERY=album
+    album_items: Tuple[CatalogItem, ...]
+    album_chunks: Tuple[Tuple[InputMediaPhoto, ...], ...]
+    links_markup: Optional[InlineKeyboardMarkup]
+    links_text: str
+
+    @property
+    def onboarding(self) -> Tuple[CatalogItem, ...]:
+        return self.items[:ONBOARDING_WORKOUTS]
+
+    @property
+    def first(self) -> Optional[CatalogItem]:
+        return self.items[0] if self.items else None
+
+
+def _build_item(w: WorkoutCatalog) -> CatalogItem:
+    kb = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text='Перейти до тренування', url=w.url)]]) if w.url else None
+    return CatalogItem(id=w.id, code=w.code, caption=w.caption, url=w.url,
+                       photo_file_id=w.photo_file_id or None, reply_markup=kb)
+
+
+def _build_snapshot(version: int, items: Tuple[CatalogItem, ...]) -> CatalogSnapshot:
+    onboarding = items[:ONBOARDING_WORKOUTS]
+    album_items, media, buttons, text_lines = [], [], [], []
+    for n, item in enumerate(onboarding, start=1):
+        if item.photo_file_id:
+            album_items.append(item)
+            media.append(InputMediaPhoto(media=photo_input(item.photo_file_id)[0], caption=f'{n}. {item.caption}'))
+        else:
+            text_lines.append(f'{n}. {item.caption}')
+        if item.url:
+            buttons.append([InlineKeyboardButton(text=f'▶️ Тренування {n}', url=item.url)])
+    chunks = tuple(tuple(media[i:i + MEDIA_GROUP_LIMIT]) for i in range(0, len(media), MEDIA_GROUP_LIMIT))
+    return CatalogSnapshot(
+        version=version, items=items, loaded_at=time.monotonic(),
+        album_items=tuple(album_items), album_chunks=chunks,
+        links_markup=InlineKeyboardMarkup(inline_keyboard=buttons) if buttons else None,
+        links_text='\n\n'.join(text_lines),
+    )
+
+
+_snapshot: Optional[CatalogSnapshot] = None
+_lock = asyncio.Lock()
+
+
+async def reload_catalog() -> CatalogSnapshot:
+    global _snapshot
+    async with SessionLocal() as session:
+        workouts = (await session.execute(
+            select(WorkoutCatalog).where(WorkoutCatalog.is_active == True).order_by(WorkoutCatalog.id))).scalars().all()
+    version = (_snapshot.version + 1) if _snapshot else 1
+    # підміна одним присвоєнням: хто вже взяв старий знімок, дочитає його до кінця
+    _snapshot = _build_snapshot(version, tuple(_build_item(w) for w in workouts))
+    logger.info("workout catalog v%s loaded: %s active", version, len(_snapshot.items))
+    return _snapshot
+
+
+async def get_catalog() -> CatalogSnapshot:
+    snap = _snapshot
+    if snap is not None and time.monotonic() - snap.loaded_at <= CATALOG_CACHE_TTL:
+        return snap
+    async with _lock:
+        snap = _snapshot
+        if snap is not None and time.monotonic() - snap.loaded_at <= CATALOG_CACHE_TTL:
+            return snap
+        return await reload_catalog()
+
+
+async def remember_photo_file_id(workout_id: int, file_id: str) -> None:
+    async with SessionLocal() as session:
+        await session.execute(update(WorkoutCatalog).where(WorkoutCatalog.id == workout_id).values(photo_file_id=file_id))
+        await session.commit()
+    await reload_catalog()
+
+
+# (частина курсу, message_id) — викликається одразу після кожної відправки
+OnSent = Callable[[str, int], Awaitable[None]]
+
+
+async def send_onboarding(bot: Bot, chat_id: int, on_sent: Optional[OnSent] = None,
+                          skip: Collection[str] = ()) -> List[int]:
+    """Надсилає стартові тренування і повертає id усіх надісланих повідомлень.
+
+    `on_sent` отримує кожне повідомлення одразу після відправки ('workout:<id>' або 'links'),
+    тож якщо відправка впаде посередині, вже доставлені повідомлення не загубляться.
+    Частини з `skip` (доставлені попередньою спробою) не надсилаються.
+    """
+    message_ids = []
+
+    async def sent(part: str, message_id: int) -> None:
+        message_ids.append(message_id)
+        if on_sent is not None:
+            await on_sent(part, message_id)
+
+    snap = await get_catalog()
+    if not snap.onboarding:
+        return []
+    if ONBOARDING_DELIVERY != 'album':
+        for item in snap.onboarding:
+            if f'workout:{item.id}' in skip:
+                continue
+            await sent(f'workout:{item.id}', (await item.send(bot, chat_id)).message_id)
+        return message_ids
+
+    uploaded = []
+    offset = 0
+    for chunk in snap.album_chunks:
+        items = snap.album_items[offset:offset + len(chunk)]
+        offset += len(chunk)
+        pending = [(media, item) for media, item in zip(chunk, items) if f'workout:{item.id}' not in skip]
+        if not pending:
+            continue
+        if len(pending) == 1:
+            media = pending[0][0]
+            photo = await bot.send_photo(chat_id, media.media, caption=media.caption, protect_content=True)
+            messages = [photo]
+        else:
+            messages = await bot.send_media_group(chat_id, [media for media, _ in pending], protect_content=True)
+        for (_, item), msg in zip(pending, messages):
+            await sent(f'workout:{item.id}', msg.message_id)
+            if photo_input(item.photo_file_id)[1] and msg.photo:
+                uploaded.append((item.id, msg.photo[-1].file_id))
+    if (snap.links_markup or snap.links_text) and 'links' not in skip:
+        text = await T('WORKOUT_LINKS')
+        if snap.links_text:
+            text = f'{text}\n\n{snap.links_text}'
+        msg = await bot.send_message(chat_id, text, reply_markup=snap.links_markup, protect_content=True)
+        await sent('links', msg.message_id)
+    for workout_id, file_id in uploaded:
+        await remember_photo_file_id(workout_id, file_id)
+    return message_ids
@@ -1,25 +1,80 @@
 import os
+import time
+import string
+import asyncio
 import datetime
+from contextlib import asynccontextmanager
 from sqlalchemy import (
-    create_engine, Column, Integer, String, DateTime, Boolean, Text, ForeignKey, UniqueConstraint
+    Column, Integer, BigInteger, String, Date, DateTime, Boolean, Text, ForeignKey, UniqueConstraint, Index, select
 )
-from sqlalchemy.orm import declarative_base, sessionmaker, relationship
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy.exc import NoResultFound
 
 # --- SQLAlchemy setup ---
 Base = declarative_base()
 DB_URL = os.getenv('DATABASE_URL', 'sqlite:///yogaxbot.db')
-engine = create_engine(DB_URL, echo=False, future=True)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+def _async_url(url: str) -> str:
+    # sqlite:///x.db -> sqlite+aiosqlite:///x.db, postgresql://... -> postgresql+asyncpg://...
+    scheme, sep, rest = url.partition('://')
+    if '+' in scheme:
+        return url
+    if scheme == 'sqlite':
+        return f'sqlite+aiosqlite{sep}{rest}'
+    if scheme in ('postgres', 'postgresql'):
+        return f'postgresql+asyncpg{sep}{rest}'
+    return url
+
+ASYNC_DB_URL = _async_url(DB_URL)
+engine = create_async_engine(ASYNC_DB_URL, echo=False)
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+@asynccontextmanager
+async def use_session(session=None):
+    """Передана сесія (сесія апдейту) або нова коротка, якщо виклик поза апдейтом."""
+    if session is not None:
+        yield session
+        return
+    async with SessionLocal() as own:
+        yield own
+
+async def session_middleware(handler, event, data):
+    """Одна сесія на апдейт: хендлери і фільтри отримують її як `session`.
+
+    Наприкінці — один commit, при винятку — rollback. Хендлер може закомітити
+    раніше, щоб віддати з'єднання в пул перед повільними викликами Bot API:
+    сесія лишається придатною і далі.
+    """
+    async with SessionLocal() as session:
+        data['session'] = session
+        try:
+            result = await handler(event, data)
+        except Exception:
+            await session.rollback()
+            raise
+        await session.commit()
+        return result
 
 # --- Моделі ---
+# id користувачів і чатів Telegram бувають більші за 2^31: у PostgreSQL це bigint.
+# У SQLite INTEGER і так 64-бітний, а для первинного ключа лишається псевдонімом rowid.
+TelegramId = BigInteger().with_variant(Integer(), 'sqlite')
+
 class User(Base):
     __tablename__ = 'users'
-    user_id = Column(Integer, primary_key=True, autoincrement=False)
+    __table_args__ = (
+        Index('ix_users_status_trial_expires_at', 'status', 'trial_expires_at'),
+        Index('ix_users_status_blocked_next_reminder_at', 'status', 'blocked', 'next_reminder_at'),
+        Index('ix_users_trial_expires_at', 'trial_expires_at'),
+        Index('ix_users_blocked_user_id', 'blocked', 'user_id'),
+    )
+    user_id = Column(TelegramId, primary_key=True, autoincrement=False)
     status = Column(String, nullable=False, default='new')
     trial_started_at = Column(DateTime, nullable=True)
     trial_expires_at = Column(DateTime, nullable=True)
     last_reminder_at = Column(DateTime, nullable=True)
+    next_reminder_at = Column(DateTime, nullable=True)
     extension_used = Column(Boolean, default=False, nullable=False)
     blocked = Column(Boolean, default=False, nullable=False)
     start_pending_at = Column(DateTime, nullable=True)
@@ -28,10 +83,17 @@ class User(Base):
 
 class WorkoutMessage(Base):
     __tablename__ = 'workout_messages'
+    __table_args__ = (
+        Index('ix_workout_messages_user_id', 'user_id'),
+        Index('ix_workout_messages_created_at', 'created_at'),
+    )
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey('users.user_id'), nullable=False)
-    chat_id = Column(Integer, nullable=False)
+    user_id = Column(TelegramId, ForeignKey('users.user_id'), nullable=False)
+    chat_id = Column(TelegramId, nullable=False)
     message_id = Column(Integer, nullable=False)
+    # частина стартового курсу: intro / workout:<id> / links — щоб повтор задачі не дублював;
+    # None — тренування, надіслане кнопкою
+    part = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
     user = relationship('User', back_populates='workout_messages')
 
@@ -42,6 +104,7 @@ class TextBlock(Base):
 
 class WorkoutCatalog(Base):
     __tablename__ = 'workout_catalogs'
+    __table_args__ = (Index('ix_workout_catalogs_is_active_id', 'is_active', 'id'),)
     id = Column(Integer, primary_key=True)
     code = Column(String, unique=True, nullable=False)
     caption = Column(Text, nullable=False)
@@ -58,9 +121,107 @@ class BroadcastLog(Base):
     total = Column(Integer, nullable=False)
     success = Column(Integer, nullable=False)
     failed = Column(Integer, nullable=False)
+    # розсилка як задача: pending -> running -> done
+    status = Column(String, nullable=False, default='pending')
+    payload = Column(Text, nullable=True)
+    photo_file_id = Column(String, nullable=True)
+    admin_chat_id = Column(TelegramId, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    deliveries = relationship('BroadcastDelivery', back_populates='broadcast')
+
+class BroadcastDelivery(Base):
+    __tablename__ = 'broadcast_deliveries'
+    __table_args__ = (
+        UniqueConstraint('broadcast_id', 'user_id'),
+        Index('ix_broadcast_deliveries_claim', 'broadcast_id', 'status', 'id'),
+    )
+    id = Column(Integer, primary_key=True)
+    broadcast_id = Column(Integer, ForeignKey('broadcast_logs.id'), nullable=False)
+    user_id = Column(TelegramId, nullable=False)
+    # pending / sending (взято воркером) / sent / failed / blocked
+    status = Column(String, nullable=False, default='pending')
+    error = Column(String, nullable=True)
+    updated_at = Column(DateTime, nullable=True)
+    broadcast = relationship('BroadcastLog', back_populates='deliveries')
+
+class DelayedTask(Base):
+    # відкладена задача: одна на (kind, user_id), виконується диспетчером з delayed_tasks.py
+    __tablename__ = 'delayed_tasks'
+    __table_args__ = (
+        UniqueConstraint('kind', 'user_id'),
+        Index('ix_delayed_tasks_run_at', 'run_at'),
+    )
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    user_id = Column(TelegramId, nullable=False)
+    chat_id = Column(TelegramId, nullable=False)
+    run_at = Column(DateTime, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+class FsmState(Base):
+    # FSM aiogram (адмінські майстри): спільний для всіх процесів бота, див. fsm_storage.py
+    __tablename__ = 'fsm_states'
+    key = Column(String, primary_key=True)
+    state = Column(String, nullable=True)
+    data = Column(Text, nullable=True)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+class UserStatusCount(Base):
+    # скільки користувачів у кожному статусі; оновлюється разом зі зміною статусу, див. stats.py
+    __tablename__ = 'user_status_counts'
+    status = Column(String, primary_key=True)
+    users = Column(Integer, default=0, nullable=False)
+
+class DailyStat(Base):
+    # денні лічильники подій (trials_started, reminders_sent, broadcast_sent, ...)
+    __tablename__ = 'daily_stats'
+    day = Column(Date, primary_key=True)
+    name = Column(String, primary_key=True)
+    value = Column(Integer, default=0, nullable=False)
+
+# --- Схема БД (Alembic) ---
+# Схему створюють і змінюють міграції з migrations/: `alembic upgrade head`.
+# При старті лише перевіряємо ревізію; DB_AUTO_MIGRATE=1 накочує міграції сам.
+DB_AUTO_MIGRATE = os.getenv('DB_AUTO_MIGRATE', '0') == '1'
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'alembic.ini')
+
+def _alembic_config():
+    from alembic.config import Config
+    return Config(ALEMBIC_INI)
 
-# --- Створення таблиць ---
-Base.metadata.create_all(engine)
+def _schema_revision(conn):
+    from alembic.runtime.migration import MigrationContext
+    return MigrationContext.configure(conn).get_current_revision()
+
+def _upgrade(conn, cfg):
+    from alembic import command
+    cfg.attributes['connection'] = conn
+    command.upgrade(cfg, 'head')
+
+async def init_db() -> None:
+    from alembic.script import ScriptDirectory
+    cfg = _alembic_config()
+    head = ScriptDirectory.from_config(cfg).get_current_head()
+    async with engine.begin() as conn:
+        current = await conn.run_sync(_schema_revision)
+        if current == head:
+            return
+        if not DB_AUTO_MIGRATE:
+            raise RuntimeError(
+                f'Схема БД на ревізії {current}, потрібна {head}. Виконайте `alembic upgrade head` '
+                f'(база, створена старою версією бота через create_all: спершу `alembic stamp 0001`) '
+                f'або запустіть з DB_AUTO_MIGRATE=1.'
+            )
+        await conn.run_sync(_upgrade, cfg)
+
+def dialect_insert(model):
+    """INSERT з підтримкою ON CONFLICT для поточного діалекту (SQLite або PostgreSQL)."""
+    if engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
 
 # --- Дефолтні тексти ---
 DEFAULT_TEXTS = {
@@ -87,6 +248,9 @@ DEFAULT_TEXTS = {
         'Термін дії безкоштовного доступу завершився.\n'
         'Оформіть абонемент, щоб продовжити тренування.'
     ),
+    'WORKOUT_LINKS': (
+        'Посилання на тренування:'
+    ),
     'DISCOUNT_MSG': (
         'Тільки сьогодні! Знижка на абонемент для нових користувачів.\n'
         'Поспішайте скористатися пропозицією.'
@@ -96,27 +260,107 @@ DEFAULT_TEXTS = {
 DISCOUNT_DEEP_LINK = 'https://t.me/yogaxbot?start=discount2024'
 
 # --- Хелпер для текстів ---
-def T_session():
-    return SessionLocal()
-
-async def T(key, **fmt):
-    session = T_session()
-    try:
-        block = session.query(TextBlock).filter_by(key=key).first()
-        text = block.content if block else DEFAULT_TEXTS.get(key, key)
-    finally:
-        session.close()
-    if fmt:
+# Усі TextBlock тримаються в пам'яті процесу; адмінка скидає кеш при редагуванні,
+# а TTL підстраховує, коли ботів кілька і редагування було в іншому процесі.
+TEXT_CACHE_TTL = float(os.getenv('TEXT_CACHE_TTL', '300'))
+
+class TextTemplate:
+    """Текст блоку з наперед розібраним шаблоном: поля форматування визначаються один раз."""
+    __slots__ = ('text', 'fields', 'plain')
+
+    def __init__(self, text: str):
+        self.text = text
+        try:
+            self.fields = frozenset(name for _, name, _, _ in string.Formatter().parse(text) if name is not None)
+        except ValueError:
+            self.fields = frozenset()
+        # без фігурних дужок format() нічого не змінить — пропускаємо його
+        self.plain = '{' not in text and '}' not in text
+
+    def render(self, fmt: dict) -> str:
+        if not fmt or self.plain:
+            return self.text
         try:
-            text = text.format(**fmt)
+            return self.text.format(**fmt)
         except Exception:
-            pass
-    return text
+            return self.text
+
+_DEFAULT_TEMPLATES = {key: TextTemplate(text) for key, text in DEFAULT_TEXTS.items()}
+_text_cache = {}
+_text_cache_loaded_at = None
+_text_cache_lock = asyncio.Lock()
+
+async def load_texts(session=None) -> None:
+    global _text_cache, _text_cache_loaded_at
+    async with use_session(session) as s:
+        rows = (await s.execute(select(TextBlock.key, TextBlock.content))).all()
+    _text_cache = {key: TextTemplate(content) for key, content in rows}
+    _text_cache_loaded_at = time.monotonic()
+
+def invalidate_texts() -> None:
+    global _text_cache_loaded_at
+    _text_cache_loaded_at = None
+
+async def _texts(session=None) -> dict:
+    if _text_cache_loaded_at is None or time.monotonic() - _text_cache_loaded_at > TEXT_CACHE_TTL:
+        async with _text_cache_lock:
+            if _text_cache_loaded_at is None or time.monotonic() - _text_cache_loaded_at > TEXT_CACHE_TTL:
+                await load_texts(session)
+    return _text_cache
+
+async def get_text_block(key: str, session=None):
+    """Сирий вміст TextBlock без дефолтів (наприклад, file_id для WELCOME_PHOTO)."""
+    tpl = (await _texts(session)).get(key)
+    return tpl.text if tpl else None
+
+async def set_text_block(key: str, content: str, session=None) -> None:
+    # комітимо одразу і навіть у сесії апдейту: кеш можна скидати лише після коміту
+    async with use_session(session) as s:
+        block = await s.get(TextBlock, key)
+        if block:
+            block.content = content
+        else:
+            s.add(TextBlock(key=key, content=content))
+        await s.commit()
+    invalidate_texts()
+
+async def T(key, *, session=None, **fmt):
+    tpl = (await _texts(session)).get(key) or _DEFAULT_TEMPLATES.get(key)
+    if tpl is None:
+        return key
+    return tpl.render(fmt)
+
+# --- Потокова ітерація по користувачах ---
+USER_BATCH_SIZE = int(os.getenv('USER_BATCH_SIZE', '1000'))
+
+async def iter_users(*columns, filters=(), batch_size=None, session=None):
+    """Віддає батчі рядків (user_id, *columns), гортаючи таблицю users по user_id (keyset).
+
+    Без `session` кожна сторінка читається в окремій короткій сесії, тож між
+    батчами (і мережевими await-ами) жодне з'єднання не тримається відкритим.
+    """
+    batch_size = batch_size or USER_BATCH_SIZE
+    last_id = None
+    while True:
+        stmt = select(User.user_id, *columns).where(*filters)
+        if last_id is not None:
+            stmt = stmt.where(User.user_id > last_id)
+        stmt = stmt.order_by(User.user_id).limit(batch_size)
+        if session is None:
+            async with SessionLocal() as s:
+                rows = (await s.execute(stmt)).all()
+        else:
+            rows = (await session.execute(stmt)).all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1].user_id
 
-def seed_free_workouts_if_empty() -> None:
-    session = SessionLocal()
-    try:
-        has_any = session.query(WorkoutCatalog).first() is not None
+async def seed_free_workouts_if_empty() -> None:
+    async with SessionLocal() as session:
+        has_any = (await session.execute(select(WorkoutCatalog.id).limit(1))).first() is not None
         if has_any:
             return
         items = [
@@ -152,7 +396,7 @@ def seed_free_workouts_if_empty() -> None:
             },
         ]
         for it in items:
-            existing = session.query(WorkoutCatalog).filter_by(code=it['code']).first()
+            existing = (await session.execute(select(WorkoutCatalog).filter_by(code=it['code']))).scalar()
             if existing:
                 existing.caption = it['caption']
                 existing.url = it['url']
@@ -165,6 +409,4 @@ def seed_free_workouts_if_empty() -> None:
                     photo_file_id='',
                     is_active=True
                 ))
-        session.commit()
-    finally:
-        session.close()
+        await session.commit()
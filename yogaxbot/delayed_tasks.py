@@ -0,0 +1,104 @@
+import logging
+import os
+from datetime import datetime, timedelta
+from aiogram import Bot
+from sqlalchemy import select, update, delete
+from db import SessionLocal, DelayedTask, dialect_insert
+from ratelimit import run_limited
+from blocked import is_dead_chat_error
+from outbound import Priority, priority
+
+logger = logging.getLogger(__name__)
+
+# Відкладені задачі живуть у таблиці delayed_tasks, а не в пам'яті APScheduler:
+# переживають рестарт, а повторний /start не створює дубль (унікальність kind + user_id).
+DELAYED_TASKS_POLL = float(os.getenv('DELAYED_TASKS_POLL', '5'))
+DELAYED_TASKS_BATCH = int(os.getenv('DELAYED_TASKS_BATCH', '100'))
+DELAYED_TASKS_CONCURRENCY = int(os.getenv('DELAYED_TASKS_CONCURRENCY', '10'))
+DELAYED_TASKS_LEASE = timedelta(seconds=int(os.getenv('DELAYED_TASKS_LEASE', '300')))
+DELAYED_TASKS_MAX_ATTEMPTS = int(os.getenv('DELAYED_TASKS_MAX_ATTEMPTS', '5'))
+
+_handlers = {}
+
+
+def task_handler(kind: str):
+    """Реєструє `async def handler(user_id, chat_id, bot)` для задач виду `kind`."""
+    def decorator(func):
+        _handlers[kind] = func
+        return func
+    return decorator
+
+
+async def schedule_task(kind: str, user_id: int, chat_id: int, run_at: datetime, session=None) -> bool:
+    """Ставить задачу в чергу. Якщо така (kind, user_id) вже чекає — нічого не робить.
+
+    З `session` (сесія апдейту) запис комітиться разом з нею. Повертає True, якщо задачу створено.
+    """
+    stmt = dialect_insert(DelayedTask).values(
+        kind=kind, user_id=user_id, chat_id=chat_id, run_at=run_at, attempts=0, created_at=datetime.utcnow(),
+    ).on_conflict_do_nothing(index_elements=['kind', 'user_id'])
+    if session is not None:
+        return bool((await session.execute(stmt)).rowcount)
+    async with SessionLocal() as own:
+        result = await own.execute(stmt)
+        await own.commit()
+    return bool(result.rowcount)
+
+
+async def _claim(now: datetime):
+    # забираємо батч, відсуваючи run_at на час оренди: інший процес ці задачі не візьме,
+    # а якщо цей впаде посеред виконання — задача повернеться після закінчення оренди
+    due = select(DelayedTask.id).where(DelayedTask.run_at <= now).order_by(DelayedTask.run_at).limit(DELAYED_TASKS_BATCH)
+    stmt = (
+        update(DelayedTask)
+        .where(DelayedTask.id.in_(due.scalar_subquery()), DelayedTask.run_at <= now)
+        .values(run_at=now + DELAYED_TASKS_LEASE, attempts=DelayedTask.attempts + 1)
+        .returning(DelayedTask.id, DelayedTask.kind, DelayedTask.user_id, DelayedTask.chat_id, DelayedTask.attempts)
+    )
+    async with SessionLocal() as session:
+        rows = (await session.execute(stmt)).all()
+        await session.commit()
+    return rows
+
+
+async def dispatch_delayed_tasks(bot: Bot) -> int:
+    """Виконує задачі, час яких настав. Викликається планувальником кожні DELAYED_TASKS_POLL секунд."""
+    processed = 0
+    while True:
+        now = datetime.utcnow()
+        tasks = await _claim(now)
+        if not tasks:
+            return processed
+
+        async def run(task):
+            handler = _handlers.get(task.kind)
+            if handler is None:
+                raise LookupError(f'no handler for delayed task kind={task.kind}')
+            with priority(Priority.ONBOARDING):
+                await handler(task.user_id, task.chat_id, bot)
+
+        finished, retry = [], []
+        for task, outcome in await run_limited(tasks, run, DELAYED_TASKS_CONCURRENCY):
+            if not isinstance(outcome, Exception):
+                finished.append(task.id)
+            elif is_dead_chat_error(outcome):
+                # користувач заблокував бота — повтори нічого не дадуть
+                logger.info("delayed task %s for user_id=%s dropped: chat unavailable", task.kind, task.user_id)
+                finished.append(task.id)
+            elif task.attempts >= DELAYED_TASKS_MAX_ATTEMPTS:
+                logger.error("delayed task %s for user_id=%s dropped after %s attempts: %s",
+                             task.kind, task.user_id, task.attempts, outcome)
+                finished.append(task.id)
+            else:
+                logger.warning("delayed task %s for user_id=%s failed (attempt %s): %s",
+                               task.kind, task.user_id, task.attempts, outcome)
+                retry.append({'id': task.id, 'run_at': now + timedelta(seconds=30 * 2 ** task.attempts)})
+        async with SessionLocal() as session:
+            if finished:
+                await session.execute(delete(DelayedTask).where(DelayedTask.id.in_(finished)))
+            if retry:
+                await session.execute(update(DelayedTask), retry)
+            await session.commit()
+        processed += len(tasks)
+        if len(tasks) < DELAYED_TASKS_BATCH:
+            return processed
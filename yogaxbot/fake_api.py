@@ -0,0 +1,80 @@
+import asyncio
+import itertools
+import logging
+import random
+from datetime import datetime
+from typing import Any, AsyncGenerator, Dict, Iterable, List, Optional
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import TelegramMethod, GetMe, SendMessage, SendPhoto, SendMediaGroup, GetUpdates
+from aiogram.types import Chat, Message, PhotoSize, User
+
+logger = logging.getLogger(__name__)
+
+
+class FakeTelegramSession(BaseSession):
+    """Сесія Bot API без мережі: записує виклики і повертає правдоподібні відповіді.
+
+    Використовується для локального запуску (FAKE_TELEGRAM_API=1) — наприклад, щоб
+    POST-ити зразки апдейтів у webhook без зв'язку з Telegram.
+    Для бенчмарків (bench/) може імітувати затримку мережі, відповіді 429
+    з `retry_after` і користувачів, що заблокували бота.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, retry_after_rate: float = 0.0,
+                 retry_after: int = 1, blocked: Iterable[int] = (), seed: Optional[int] = None,
+                 **kwargs: Any):
+        super().__init__(**kwargs)
+        self.calls: List[TelegramMethod] = []
+        self._message_ids = itertools.count(1)
+        self.latency = latency
+        self.jitter = jitter
+        self.retry_after_rate = retry_after_rate
+        self.retry_after = retry_after
+        self.blocked = set(blocked)
+        self._random = random.Random(seed)
+        self.errors: Dict[str, int] = {}
+
+    async def _simulate(self, method: TelegramMethod) -> None:
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.retry_after_rate and self._random.random() < self.retry_after_rate:
+            self.errors['retry_after'] = self.errors.get('retry_after', 0) + 1
+            raise TelegramRetryAfter(method=method, message='Too Many Requests: retry later',
+                                     retry_after=self.retry_after)
+        chat_id = getattr(method, 'chat_id', None)
+        if self.blocked and chat_id is not None and int(chat_id) in self.blocked:
+            self.errors['forbidden'] = self.errors.get('forbidden', 0) + 1
+            raise TelegramForbiddenError(method=method, message='Forbidden: bot was blocked by the user')
+
+    def _message(self, chat_id, **fields) -> Message:
+        return Message(message_id=next(self._message_ids), date=datetime.now(),
+                       chat=Chat(id=int(chat_id), type='private'), **fields)
+
+    def _photo(self, file_id: str) -> List[PhotoSize]:
+        return [PhotoSize(file_id=f'fake-{abs(hash(str(file_id)))}', file_unique_id='fake', width=1, height=1)]
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        self.calls.append(method)
+        logger.info("fake api: %s", method.__api_method__)
+        await self._simulate(method)
+        if isinstance(method, GetMe):
+            return User(id=bot.id, is_bot=True, first_name='YogaX (fake)', username='yogaxbot')
+        if isinstance(method, SendMessage):
+            return self._message(method.chat_id, text=method.text)
+        if isinstance(method, SendPhoto):
+            return self._message(method.chat_id, photo=self._photo(method.photo), caption=method.caption)
+        if isinstance(method, SendMediaGroup):
+            return [self._message(method.chat_id, photo=self._photo(m.media), caption=m.caption) for m in method.media]
+        if isinstance(method, GetUpdates):
+            return []
+        return True
+
+    async def stream_content(self, url: str, headers: Optional[Dict[str, Any]] = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        yield b''
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,87 @@
+import contextvars
+import json
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType
+from sqlalchemy import delete, select
+from db import SessionLocal, FsmState, dialect_insert
+
+# Кеш читання живе лише в межах одного апдейту: aiogram читає стан кілька разів за апдейт
+# (фільтри, FSMContext, хендлер), а наступний апдейт може прийти в інший процес —
+# тож між апдейтами стан завжди береться з БД.
+_update_cache: contextvars.ContextVar[Optional[Dict[str, Tuple[Optional[str], Optional[str]]]]] = \
+    contextvars.ContextVar('yogaxbot_fsm_cache', default=None)
+
+
+def _key(key: StorageKey) -> str:
+    return f'{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ""}:{key.destiny}'
+
+
+def _dump(data: Dict[str, Any]) -> Optional[str]:
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False) if data else None
+
+
+class SQLAlchemyStorage(BaseStorage):
+    """FSM-сховище aiogram у таблиці fsm_states з кешем читання на час одного апдейту.
+
+    Порожній запис (без стану і даних) видаляється, тож у таблиці лише активні майстри.
+    Кеш вмикає `update_cache_middleware` (зовнішній middleware апдейтів); без нього — щоразу БД.
+    """
+
+    @staticmethod
+    async def update_cache_middleware(handler, event, data):
+        token = _update_cache.set({})
+        try:
+            return await handler(event, data)
+        finally:
+            _update_cache.reset(token)
+
+    def _remember(self, key: str, state: Optional[str], data: Optional[str]) -> None:
+        cache = _update_cache.get()
+        if cache is not None:
+            cache[key] = (state, data)
+
+    async def _load(self, key: str) -> Tuple[Optional[str], Optional[str]]:
+        cache = _update_cache.get()
+        if cache is not None and key in cache:
+            return cache[key]
+        async with SessionLocal() as session:
+            row = (await session.execute(select(FsmState.state, FsmState.data).where(FsmState.key == key))).first()
+        state, data = (row.state, row.data) if row else (None, None)
+        self._remember(key, state, data)
+        return state, data
+
+    async def _store(self, key: str, **values: Optional[str]) -> None:
+        async with SessionLocal() as session:
+            stmt = dialect_insert(FsmState).values(key=key, updated_at=datetime.utcnow(), **values)
+            stmt = stmt.on_conflict_do_update(index_elements=['key'], set_=dict(values, updated_at=stmt.excluded.updated_at))
+            await session.execute(stmt)
+            await session.execute(delete(FsmState).where(
+                FsmState.key == key, FsmState.state.is_(None), FsmState.data.is_(None)))
+            await session.commit()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        k = _key(key)
+        value = state.state if isinstance(state, State) else state
+        _, data = await self._load(k)
+        await self._store(k, state=value)
+        self._remember(k, value, data)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._load(_key(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        k = _key(key)
+        value = _dump(data)
+        state, _ = await self._load(k)
+        await self._store(k, data=value)
+        self._remember(k, state, value)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._load(_key(key))
+        return json.loads(data) if data else {}
+
+    async def close(self) -> None:
+        pass
@@ -7,5 +7,6 @@ from . import common  # noqa: F401
 from . import start  # noqa: F401
 from . import admin  # noqa: F401
 from . import workouts  # noqa: F401
+from . import texts  # noqa: F401
 from . import broadcast  # noqa: F401
 from . import tasks  # noqa: F401
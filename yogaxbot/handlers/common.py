@@ -1,29 +1,43 @@
 import os
+import time
+import asyncio
 import logging
+from typing import Union
 from aiogram import Bot
 from aiogram.enums import ParseMode
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardButton, InlineKeyboardMarkup
+from aiogram.filters import BaseFilter
+from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardButton, InlineKeyboardMarkup, Message, CallbackQuery
+from sqlalchemy import select, insert, update, exists, func, literal, false
+from sqlalchemy.orm import aliased
 from aiogram.fsm.state import State, StatesGroup
-from db import SessionLocal, User, DISCOUNT_DEEP_LINK
+from db import use_session, engine, User, DISCOUNT_DEEP_LINK
+import stats
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Тексти кнопок, на які реагують хендлери (F.text). capture.py лишає їх у записі апдейтів як є.
+BTN_FREE_COURSE = '🧘‍♀️ Безкоштовний курс'
+BTN_CHAT = '💬 Чат школи йоги'
+BTN_WRITE_COACH = 'Написати тренеру'
+BTN_BUY = '💳 Купити абонемент'
+BTN_MY_STATUS = 'ℹ️ Мій статус'
+BUTTON_TEXTS = frozenset({BTN_FREE_COURSE, BTN_CHAT, BTN_WRITE_COACH, BTN_BUY, BTN_MY_STATUS})
+
 def get_main_reply_keyboard():
     return ReplyKeyboardMarkup(
         keyboard=[
-            [KeyboardButton(text='🧘‍♀️ Безкоштовний курс')],
-            [KeyboardButton(text='💬 Чат школи йоги')],
-            [KeyboardButton(text='Написати тренеру')]
+            [KeyboardButton(text=BTN_FREE_COURSE)],
+            [KeyboardButton(text=BTN_CHAT)],
+            [KeyboardButton(text=BTN_WRITE_COACH)]
         ],
         resize_keyboard=True,
         is_persistent=True
     )
 
-def menu_text(user_id: int) -> str:
-    session = SessionLocal()
-    try:
-        user = session.query(User).get(user_id)
+async def menu_text(user_id: int, session=None) -> str:
+    async with use_session(session) as s:
+        user = await s.get(User, user_id)
         status = user.status if user else 'new'
         days_left = ''
         if user and user.trial_expires_at:
@@ -31,8 +45,6 @@ def menu_text(user_id: int) -> str:
             if delta >= 0:
                 days_left = f' (Залишилось днів: {delta})'
         return f'Ваш статус: <b>{status}</b>{days_left}'
-    finally:
-        session.close()
 
 class AdminStates(StatesGroup):
     settext = State()
@@ -63,13 +75,83 @@ def _load_admin_ids():
     _DEF_ADMIN_IDS = ids
     return _DEF_ADMIN_IDS
 
-def is_admin(user_id: int) -> bool:
-    admin_ids = _load_admin_ids()
-    if user_id in admin_ids:
+# Користувачі зі статусом 'admin' у БД: тримаються в пам'яті і підтримуються grant_admin/revoke_admin,
+# тож перевірка прав не ходить у БД; TTL підхоплює зміни, зроблені в інших процесах.
+ADMIN_CACHE_TTL = float(os.getenv('ADMIN_CACHE_TTL', '60'))
+# ключ advisory-блокування PostgreSQL для видачі прав першому адміну
+ADMIN_BOOTSTRAP_LOCK_KEY = 7331001
+
+_db_admin_ids = None
+_db_admin_loaded_at = None
+_db_admin_lock = asyncio.Lock()
+
+async def load_admin_roles(session=None) -> set:
+    global _db_admin_ids, _db_admin_loaded_at
+    async with use_session(session) as s:
+        ids = (await s.execute(select(User.user_id).where(User.status == 'admin'))).scalars().all()
+    _db_admin_ids = set(ids)
+    _db_admin_loaded_at = time.monotonic()
+    logger.info("Admin roles loaded: %s from DB, %s from env", len(_db_admin_ids), len(_load_admin_ids()))
+    return _db_admin_ids
+
+def _admin_cache_stale() -> bool:
+    return _db_admin_loaded_at is None or time.monotonic() - _db_admin_loaded_at > ADMIN_CACHE_TTL
+
+async def _admin_roles(session=None) -> set:
+    if _admin_cache_stale():
+        async with _db_admin_lock:
+            if _admin_cache_stale():
+                await load_admin_roles(session)
+    return _db_admin_ids
+
+def grant_admin(user_id: int) -> None:
+    if _db_admin_ids is not None:
+        _db_admin_ids.add(user_id)
+
+def revoke_admin(user_id: int) -> None:
+    if _db_admin_ids is not None:
+        _db_admin_ids.discard(user_id)
+
+async def bootstrap_admin(user_id: int, session) -> bool:
+    """Робить `user_id` адміном, лише якщо в БД ще немає жодного. Перевірка і запис —
+    один умовний INSERT/UPDATE під блокуванням, тож два одночасні /admin не дадуть двох адмінів."""
+    global _db_admin_loaded_at
+    admins = aliased(User)
+    no_admin = ~exists().where(admins.status == 'admin')
+    async with _db_admin_lock:
+        if engine.dialect.name == 'postgresql':
+            # у READ COMMITTED два UPDATE різних рядків не бачать один одного — серіалізуємо явно
+            await session.execute(select(func.pg_advisory_xact_lock(ADMIN_BOOTSTRAP_LOCK_KEY)))
+        user = await session.get(User, user_id)
+        if user is None:
+            result = await session.execute(insert(User).from_select(
+                ['user_id', 'status', 'extension_used', 'blocked'],
+                select(literal(user_id), literal('admin'), false(), false()).where(no_admin)))
+            if result.rowcount:
+                await stats.user_created(session, 'admin')
+        else:
+            old_status = user.status
+            result = await session.execute(
+                update(User).where(User.user_id == user_id, no_admin).values(status='admin')
+                .execution_options(synchronize_session=False))
+            if result.rowcount:
+                await stats.status_changed(session, old_status, 'admin')
+        await session.commit()
+        if not result.rowcount:
+            # адмін з'явився в іншому процесі — наступна перевірка перечитає ролі з БД
+            _db_admin_loaded_at = None
+            return False
+    grant_admin(user_id)
+    return True
+
+async def has_db_admin(session=None) -> bool:
+    return bool(await _admin_roles(session))
+
+async def is_admin(user_id: int, session=None) -> bool:
+    if user_id in _load_admin_ids():
         return True
-    session = SessionLocal()
-    try:
-        user = session.query(User).get(user_id)
-        return bool(user and getattr(user, 'status', None) == 'admin')
-    finally:
-        session.close()
+    return user_id in await _admin_roles(session)
+
+class IsAdmin(BaseFilter):
+    async def __call__(self, event: Union[Message, CallbackQuery], session=None) -> bool:
+        return event.from_user is not None and await is_admin(event.from_user.id, session)
@@ -1,41 +1,171 @@
+import os
+import random
 import logging
+from sqlalchemy import select, update, delete
+from zoneinfo import ZoneInfo
 from db import SessionLocal, User, WorkoutMessage, T
 from aiogram import Bot
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from ratelimit import run_limited
+from outbound import Priority, priority
+from metrics import track_job
+import stats
 
 logger = logging.getLogger(__name__)
 
-async def trial_maintenance(bot: Bot):
-    session = SessionLocal()
+# Нагадування плануються для кожного користувача окремо (users.next_reminder_at):
+# частий тік надсилає лише тих, чий час уже настав, тож навантаження розмазане по добі.
+REMINDER_INTERVAL = timedelta(days=3)
+REMINDER_CONCURRENCY = int(os.getenv('REMINDER_CONCURRENCY', '10'))
+REMINDER_TICK = int(os.getenv('REMINDER_TICK', '60'))
+REMINDER_TICK_BATCH = int(os.getenv('REMINDER_TICK_BATCH', '50'))
+REMINDER_JITTER = int(os.getenv('REMINDER_JITTER', '3600'))
+REMINDER_LEASE = timedelta(seconds=int(os.getenv('REMINDER_LEASE', '600')))
+# тихі години за місцевим часом, напр. "22-9"; порожньо — без обмежень
+REMINDER_QUIET_HOURS = os.getenv('REMINDER_QUIET_HOURS', '')
+REMINDER_TZ = os.getenv('REMINDER_TZ', 'Europe/Kyiv')
+# часовий пояс потрібен лише для тихих годин: без них база tz (tzdata) на сервері не обов'язкова
+REMINDER_ZONE = ZoneInfo(REMINDER_TZ) if REMINDER_QUIET_HOURS else None
+
+
+def _quiet_hours():
+    if not REMINDER_QUIET_HOURS:
+        return None
+    start, end = (int(h) for h in REMINDER_QUIET_HOURS.split('-'))
+    return start % 24, end % 24
+
+
+def in_quiet_hours(moment: datetime) -> bool:
+    quiet = _quiet_hours()
+    if quiet is None:
+        return False
+    start, end = quiet
+    hour = moment.replace(tzinfo=timezone.utc).astimezone(REMINDER_ZONE).hour
+    return start <= hour < end if start <= end else hour >= start or hour < end
+
+
+def next_reminder_at(after: datetime) -> datetime:
+    """Час наступного нагадування (UTC): інтервал + випадковий зсув, поза тихими годинами."""
+    due = after + REMINDER_INTERVAL + timedelta(seconds=random.uniform(0, REMINDER_JITTER))
+    if not in_quiet_hours(due):
+        return due
+    # переносимо на кінець тихих годин, теж із розкидом, щоб не було сплеску о 9:00
+    local = due.replace(tzinfo=timezone.utc).astimezone(REMINDER_ZONE)
+    wake = local.replace(hour=_quiet_hours()[1], minute=0, second=0, microsecond=0)
+    if wake <= local:
+        wake += timedelta(days=1)
+    wake += timedelta(seconds=random.uniform(0, REMINDER_JITTER))
+    return wake.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+@track_job('trial_maintenance')
+async def trial_maintenance(bot: Bot) -> int:
+    """Завершує тріали, що минули, одним UPDATE. Повертає кількість завершених."""
     now = datetime.utcnow()
-    users = session.query(User).filter(User.status == 'trial_active').all()
-    for user in users:
-        updated = False
-        if user.last_reminder_at and (now - user.last_reminder_at).days >= 3:
-            days_left = (user.trial_expires_at - now).days if user.trial_expires_at else 0
-            kb = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text='Чат школи йоги', url='https://t.me/yogaxchat')]])
-            await bot.send_message(chat_id=user.user_id, text=(await T('REMINDER_TPL', days_left=days_left)), reply_markup=kb, protect_content=True)
-            user.last_reminder_at = now
-            updated = True
-        if user.trial_expires_at and now >= user.trial_expires_at:
-            user.status = 'trial_expired'
-            updated = True
-        if updated:
-            session.commit()
-    session.close()
-
-async def purge_workouts(bot: Bot):
-    session = SessionLocal()
+    async with SessionLocal() as session:
+        result = await session.execute(
+            update(User).where(User.status == 'trial_active', User.trial_expires_at <= now)
+            .values(status='trial_expired', next_reminder_at=None))
+        await stats.status_changed(session, 'trial_active', 'trial_expired', result.rowcount)
+        await stats.bump(session, 'trials_expired', result.rowcount)
+        await session.commit()
+    if result.rowcount:
+        logger.info("trial_maintenance: %s trials expired", result.rowcount)
+    return result.rowcount
+
+
+async def _claim_reminders(now: datetime):
+    # як і delayed_tasks: відсуваємо next_reminder_at на час оренди, щоб інший процес
+    # не взяв тих самих користувачів, а після падіння нагадування повторилося
+    # тріали, що вже минули, але ще не закриті trial_maintenance (раз на годину), — не нагадуємо
+    due = (select(User.user_id)
+           .where(User.status == 'trial_active', User.blocked == False, User.next_reminder_at <= now,
+                  User.trial_expires_at > now)
+           .order_by(User.next_reminder_at).limit(REMINDER_TICK_BATCH))
+    stmt = (
+        update(User)
+        .where(User.user_id.in_(due.scalar_subquery()), User.next_reminder_at <= now, User.trial_expires_at > now)
+        .values(next_reminder_at=now + REMINDER_LEASE)
+        .returning(User.user_id, User.trial_expires_at, User.last_reminder_at)
+    )
+    async with SessionLocal() as session:
+        rows = (await session.execute(stmt)).all()
+        await session.commit()
+    return rows
+
+
+@track_job('reminders')
+async def send_reminders(bot: Bot) -> int:
+    """Тік нагадувань: надсилає не більше REMINDER_TICK_BATCH тим, чий час настав."""
     now = datetime.utcnow()
-    users = session.query(User).filter(User.trial_expires_at != None, User.trial_expires_at <= now).all()
-    for user in users:
-        workouts = session.query(WorkoutMessage).filter_by(user_id=user.user_id).all()
-        for wm in workouts:
-            try:
-                await bot.delete_message(chat_id=wm.chat_id, message_id=wm.message_id)
-            except Exception:
-                pass
-            session.delete(wm)
-        session.commit()
-    session.close()
+    if in_quiet_hours(now):
+        return 0
+    rows = await _claim_reminders(now)
+    if not rows:
+        return 0
+    kb = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text='Чат школи йоги', url='https://t.me/yogaxchat')]])
+
+    async def remind(row):
+        days_left = (row.trial_expires_at - now).days if row.trial_expires_at else 0
+        text = await T('REMINDER_TPL', days_left=days_left)
+        with priority(Priority.REMINDER):
+            await bot.send_message(chat_id=row.user_id, text=text, reply_markup=kb, protect_content=True)
+
+    reminded, values = 0, []
+    for row, outcome in await run_limited(rows, remind, REMINDER_CONCURRENCY):
+        # невдале нагадування не повторюємо — просто чекаємо наступного за розкладом
+        last = row.last_reminder_at
+        if isinstance(outcome, Exception):
+            logger.warning("reminder failed to user_id=%s err=%s", row.user_id, outcome)
+        else:
+            reminded += 1
+            last = now
+        values.append({'user_id': row.user_id, 'last_reminder_at': last, 'next_reminder_at': next_reminder_at(now)})
+    async with SessionLocal() as session:
+        await session.execute(update(User), values)
+        await stats.bump(session, 'reminders_sent', reminded)
+        await session.commit()
+    if len(rows) == REMINDER_TICK_BATCH:
+        logger.info("send_reminders: full bucket of %s, backlog remains", len(rows))
+    return reminded
+
+PURGE_BATCH_SIZE = int(os.getenv('PURGE_BATCH_SIZE', '500'))
+PURGE_MAX_BATCHES = int(os.getenv('PURGE_MAX_BATCHES', '20'))
+PURGE_CONCURRENCY = int(os.getenv('PURGE_CONCURRENCY', '10'))
+
+@track_job('purge_workouts')
+async def purge_workouts(bot: Bot) -> int:
+    now = datetime.utcnow()
+
+    async def delete_one(wm):
+        with priority(Priority.BULK):
+            await bot.delete_message(chat_id=wm.chat_id, message_id=wm.message_id)
+
+    purged = failed = 0
+    # за один запуск — не більше PURGE_MAX_BATCHES батчів, решта дочекається наступного
+    for _ in range(PURGE_MAX_BATCHES):
+        async with SessionLocal() as session:
+            workouts = (await session.execute(
+                select(WorkoutMessage.id, WorkoutMessage.chat_id, WorkoutMessage.message_id, User.blocked)
+                .join(User, User.user_id == WorkoutMessage.user_id)
+                .where(User.trial_expires_at <= now)
+                .order_by(WorkoutMessage.id)
+                .limit(PURGE_BATCH_SIZE))).all()
+        if not workouts:
+            break
+        # у чаті користувача, що заблокував бота, видалити нічого не вийде — лише чистимо записи
+        results = await run_limited([wm for wm in workouts if not wm.blocked], delete_one, PURGE_CONCURRENCY)
+        undeletable = sum(1 for _, outcome in results if isinstance(outcome, Exception))
+        async with SessionLocal() as session:
+            await session.execute(delete(WorkoutMessage).where(WorkoutMessage.id.in_([wm.id for wm in workouts])))
+            # повідомлення лишилось у чаті (старше 48 год або вже видалене) — рахуємо, а не губимо мовчки
+            await stats.bump(session, 'workouts_undeletable', undeletable)
+            await session.commit()
+        failed += undeletable
+        purged += len(workouts)
+        if len(workouts) < PURGE_BATCH_SIZE:
+            break
+    if purged:
+        logger.info("purge_workouts: %s messages purged, %s could not be deleted in Telegram", purged, failed)
+    return purged
@@ -0,0 +1,65 @@
+import logging
+from html import escape
+from aiogram import F
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from . import router
+from .common import AdminStates, IsAdmin
+from sqlalchemy.ext.asyncio import AsyncSession
+from db import DEFAULT_TEXTS, TextTemplate, get_text_block, set_text_block, T
+
+logger = logging.getLogger(__name__)
+
+# WELCOME_PHOTO — не текст, а file_id/URL фото для вітання
+EDITABLE_KEYS = list(DEFAULT_TEXTS) + ['WELCOME_PHOTO']
+
+@router.callback_query(F.data == 'admin_texts', IsAdmin())
+async def admin_texts_cb(callback: CallbackQuery, state):
+    kb = [[InlineKeyboardButton(text=key, callback_data=f'admin_settext_{key}')] for key in EDITABLE_KEYS]
+    kb.append([InlineKeyboardButton(text='⬅️ Назад', callback_data='admin_panel')])
+    await callback.message.answer('Тексти бота:', reply_markup=InlineKeyboardMarkup(inline_keyboard=kb))
+    await state.clear()
+    await callback.answer()
+
+@router.callback_query(F.data.startswith('admin_settext_'), IsAdmin())
+async def admin_settext_cb(callback: CallbackQuery, state, session: AsyncSession):
+    key = callback.data.replace('admin_settext_', '')
+    if key not in EDITABLE_KEYS:
+        await callback.answer('Невідомий ключ')
+        return
+    if key == 'WELCOME_PHOTO':
+        current = await get_text_block(key, session=session) or '—'
+        prompt = 'Надішліть фото для вітання (або текст "-", щоб прибрати фото).'
+    else:
+        current = await T(key, session=session)
+        fields = TextTemplate(current).fields
+        prompt = 'Надішліть новий текст.'
+        if fields:
+            prompt += ' Поля у поточному тексті: ' + ', '.join('{' + f + '}' for f in sorted(fields))
+    await callback.message.answer(f'<b>{key}</b>\n\nЗараз:\n{escape(current)}\n\n{escape(prompt)}')
+    await state.set_state(AdminStates.settext)
+    await state.update_data(text_key=key)
+    await callback.answer()
+
+@router.message(AdminStates.settext, IsAdmin())
+async def admin_settext_msg(message: Message, state, session: AsyncSession):
+    key = (await state.get_data()).get('text_key')
+    if not key:
+        await state.clear()
+        return
+    if key == 'WELCOME_PHOTO':
+        if message.photo:
+            content = message.photo[-1].file_id
+        elif (message.text or '').strip() == '-':
+            content = ''
+        else:
+            await message.answer('Потрібне фото. Спробуйте ще раз.')
+            return
+    else:
+        if not message.text:
+            await message.answer('Потрібен текст. Спробуйте ще раз.')
+            return
+        content = message.html_text
+    await set_text_block(key, content, session=session)
+    logger.info("Text block %s updated by user_id=%s", key, message.from_user.id)
+    await message.answer(f'Текст {key} збережено.')
+    await state.clear()
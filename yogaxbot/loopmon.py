@@ -0,0 +1,181 @@
+import asyncio
+import html
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Dict, List, Optional
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Сторож циклу подій: корутина-«пульс» прокидається кожні LOOPMON_INTERVAL секунд і міряє
+# запізнення, а окремий потік, побачивши, що пульсу нема довше LOOPMON_THRESHOLD, знімає стек
+# потоку циклу (sys._current_frames) — це і є код, що блокує всіх інших.
+LOOPMON_ENABLED = os.getenv('LOOPMON_ENABLED', '1') == '1'
+LOOPMON_INTERVAL = float(os.getenv('LOOPMON_INTERVAL', '0.1'))
+LOOPMON_THRESHOLD = float(os.getenv('LOOPMON_THRESHOLD', '0.25'))
+LOOPMON_TOP = int(os.getenv('LOOPMON_TOP', '10'))
+LOOPMON_STACK_DEPTH = int(os.getenv('LOOPMON_STACK_DEPTH', '8'))
+# звіт будується лише за останні LOOPMON_WINDOW секунд; не більше LOOPMON_MAX_SAMPLES зависань
+LOOPMON_WINDOW = float(os.getenv('LOOPMON_WINDOW', '3600'))
+LOOPMON_MAX_SAMPLES = int(os.getenv('LOOPMON_MAX_SAMPLES', '1000'))
+
+ROOT = os.path.dirname(os.path.abspath(__file__)) + os.sep
+
+
+class Stall:
+    """Одне місце в коді бота, що блокувало цикл за вікно: скільки разів і як довго."""
+    __slots__ = ('site', 'count', 'total', 'max', 'stack', 'task')
+
+    def __init__(self, site: str):
+        self.site = site
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.stack: List[str] = []
+        self.task = None
+
+
+def _frame_label(fs: traceback.FrameSummary) -> str:
+    path = fs.filename[len(ROOT):] if fs.filename.startswith(ROOT) else os.path.basename(fs.filename)
+    return f'{path}:{fs.lineno} {fs.name}'
+
+
+def _describe(frame) -> tuple:
+    """(місце в коді бота, ланцюжок викликів від найглибшого) для стеку потоку циклу."""
+    summary = traceback.extract_stack(frame)
+    ours = [fs for fs in summary if fs.filename.startswith(ROOT) and not fs.filename.endswith('loopmon.py')]
+    # найглибший кадр з коду бота — рядок, з якого пішов блокуючий виклик
+    site = _frame_label(ours[-1]) if ours else _frame_label(summary[-1])
+    stack = [_frame_label(fs) for fs in reversed(summary)][:LOOPMON_STACK_DEPTH]
+    return site, stack
+
+
+class LoopMonitor:
+    def __init__(self, interval: float = LOOPMON_INTERVAL, threshold: float = LOOPMON_THRESHOLD,
+                 window: float = LOOPMON_WINDOW):
+        self.interval = interval
+        self.threshold = threshold
+        self.window = window
+        # (коли, місце, тривалість, стек, задача) — лише з потоку циклу, без блокувань
+        self.samples = deque(maxlen=LOOPMON_MAX_SAMPLES)
+        self._beat = time.monotonic()
+        self._sample = None  # (site, stack, task) з потоку-сторожа для поточного зависання
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread = None
+        self._task = None
+        self._thread = None
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = asyncio.create_task(self._heartbeat(), name='loopmon')
+        self._thread = threading.Thread(target=self._watch, name='loopmon', daemon=True)
+        self._thread.start()
+        logger.info("Loop monitor started: interval=%ss threshold=%ss", self.interval, self.threshold)
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _heartbeat(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            with self._lock:
+                self._beat = now
+                sample, self._sample = self._sample, None
+            metrics.loop_lag_seconds.observe(lag)
+            if sample is not None:
+                self._record(lag, *sample)
+
+    def _watch(self) -> None:
+        sampled_beat = None
+        while not self._stop.wait(self.interval / 2):
+            with self._lock:
+                beat = self._beat
+            if time.monotonic() - beat < self.threshold or beat == sampled_beat:
+                continue
+            if self._loop.is_closed() or not self._loop.is_running():
+                return
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            site, stack = _describe(frame)
+            task = asyncio.current_task(self._loop)
+            task_name = task.get_coro().__qualname__ if task is not None else None
+            with self._lock:
+                if self._beat == beat:
+                    self._sample = (site, stack, task_name)
+            # один знімок на зависання; тривалість порахує пульс, коли цикл відпуститься
+            sampled_beat = beat
+            del frame
+
+    def _record(self, lag: float, site: str, stack: List[str], task: Optional[str]) -> None:
+        self.samples.append((time.monotonic(), site, lag, stack, task))
+        self._expire()
+        metrics.loop_stalls.inc(site=site)
+        logger.warning("loop blocked duration_ms=%.0f site=%r task=%r stack=%r",
+                       lag * 1000, site, task, ' <- '.join(stack))
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.window
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+
+    def top(self, n: int = LOOPMON_TOP) -> List[Stall]:
+        self._expire()
+        stalls: Dict[str, Stall] = {}
+        for _, site, lag, stack, task in self.samples:
+            stall = stalls.get(site)
+            if stall is None:
+                stall = stalls[site] = Stall(site)
+            stall.count += 1
+            stall.total += lag
+            stall.max = max(stall.max, lag)
+            # стек і задача — з останнього зависання в цьому місці
+            stall.stack, stall.task = stack, task
+        return sorted(stalls.values(), key=lambda s: s.total, reverse=True)[:n]
+
+    def report(self, n: int = LOOPMON_TOP) -> str:
+        lines = [f'<b>Блокування циклу</b> за {self.window / 60:.0f} хв '
+                 f'(&gt;{self.threshold * 1000:.0f}мс; разів, сумарно, макс.):']
+        stalls = self.top(n)
+        for stall in stalls:
+            lines.append(f'• <code>{html.escape(stall.site)}</code>: {stall.count}, {stall.total * 1000:.0f}мс, '
+                         f'{stall.max * 1000:.0f}мс' + (f' ({html.escape(stall.task)})' if stall.task else ''))
+        if not stalls:
+            lines.append('Не було.')
+        return '\n'.join(lines)
+
+
+monitor: Optional[LoopMonitor] = None
+
+
+def start() -> Optional[LoopMonitor]:
+    """Запускає сторожа в поточному циклі (LOOPMON_ENABLED=0 — вимкнено)."""
+    global monitor
+    if not LOOPMON_ENABLED:
+        return None
+    monitor = LoopMonitor()
+    monitor.start()
+    return monitor
+
+
+def stop() -> None:
+    if monitor is not None:
+        monitor.stop()
+
+
+def report() -> str:
+    return monitor.report() if monitor is not None else ''
@@ -1,22 +1,35 @@
 #!/usr/bin/env python3
 """
 YogaX Bot - Telegram бот для йоги
-Entrypoint файл з polling режимом
+Entrypoint файл: polling або webhook режим (BOT_MODE)
 """
 
 import asyncio
 import logging
 import os
 from dotenv import load_dotenv
+
+# .env має бути прочитаний до імпорту db (DATABASE_URL) та handlers
+load_dotenv()
+
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from handlers import router
-from handlers.tasks import trial_maintenance, purge_workouts
-from db import seed_free_workouts_if_empty
-
-load_dotenv()
+from handlers.tasks import trial_maintenance, send_reminders, purge_workouts, REMINDER_TICK
+from retention import run_retention, vacuum_db, RETENTION_HOUR, DB_VACUUM_DAY, DB_VACUUM_HOUR
+from handlers.common import load_admin_roles
+from db import init_db, seed_free_workouts_if_empty, engine, session_middleware
+from broadcaster import resume_broadcasts
+from delayed_tasks import dispatch_delayed_tasks, DELAYED_TASKS_POLL
+from webhook import run_webhook
+from metrics import setup_metrics, start_metrics_server
+from throttling import setup_throttling
+from blocked import BlockedTrackingMiddleware, flush_blocked, BLOCKED_FLUSH_INTERVAL
+from outbound import setup_outbound
+import loopmon
+from capture import setup_capture
 
 logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s',
@@ -27,25 +40,76 @@ BOT_TOKEN = os.getenv('BOT_TOKEN')
 if not BOT_TOKEN:
     raise ValueError('BOT_TOKEN не знайдено в .env')
 
-async def main():
-    bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-    dp = Dispatcher()
-    dp.include_router(router)
+# polling (за замовчуванням) або webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+# 1 — не ходити в Telegram, а відповідати заглушками (локальна перевірка webhook)
+FAKE_TELEGRAM_API = os.getenv('FAKE_TELEGRAM_API', '0') == '1'
+# sql — стани FSM у БД (кілька процесів бота), memory — у пам'яті одного процесу
+FSM_STORAGE = os.getenv('FSM_STORAGE', 'sql')
 
-    scheduler = AsyncIOScheduler()
-    scheduler.start()
-    scheduler.add_job(trial_maintenance, 'interval', days=1, args=[bot])
-    scheduler.add_job(purge_workouts, 'interval', minutes=10, args=[bot])
+def create_bot() -> Bot:
+    session = None
+    if FAKE_TELEGRAM_API:
+        from fake_api import FakeTelegramSession
+        session = FakeTelegramSession()
+    bot = Bot(token=BOT_TOKEN, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    bot.session.middleware(BlockedTrackingMiddleware())
+    setup_outbound(bot)
+    return bot
 
-    seed_free_workouts_if_empty()
+def create_dispatcher(scheduler: AsyncIOScheduler, bot: Bot) -> Dispatcher:
+    storage = None
+    if FSM_STORAGE == 'sql':
+        from fsm_storage import SQLAlchemyStorage
+        storage = SQLAlchemyStorage()
+    dp = Dispatcher(storage=storage)
+    dp.include_router(router)
+    # першим — щоб у запис потрапляли й апдейти, відкинуті далі (флуд-контроль)
+    setup_capture(dp)
+    if storage is not None:
+        dp.update.outer_middleware.register(storage.update_cache_middleware)
 
     async def scheduler_middleware(handler, event, data):
         data['scheduler'] = scheduler
         return await handler(event, data)
 
     dp.update.outer_middleware.register(scheduler_middleware)
+    setup_metrics(dp, bot, engine)
+    dp.update.outer_middleware.register(session_middleware)
+    setup_throttling(dp)
+    dp.shutdown.register(flush_blocked)
+    dp.shutdown.register(loopmon.stop)
+    return dp
+
+def create_scheduler(bot: Bot) -> AsyncIOScheduler:
+    scheduler = AsyncIOScheduler()
+    # фіксована фаза (щогодини о :00), а не відлік від старту процесу
+    scheduler.add_job(trial_maintenance, 'cron', minute=0, args=[bot])
+    scheduler.add_job(send_reminders, 'interval', seconds=REMINDER_TICK, args=[bot])
+    scheduler.add_job(purge_workouts, 'interval', minutes=10, args=[bot])
+    scheduler.add_job(dispatch_delayed_tasks, 'interval', seconds=DELAYED_TASKS_POLL, args=[bot])
+    scheduler.add_job(flush_blocked, 'interval', seconds=BLOCKED_FLUSH_INTERVAL)
+    scheduler.add_job(run_retention, 'cron', hour=RETENTION_HOUR, minute=30)
+    scheduler.add_job(vacuum_db, 'cron', day_of_week=DB_VACUUM_DAY, hour=DB_VACUUM_HOUR, minute=45)
+    return scheduler
+
+async def main():
+    bot = create_bot()
+    scheduler = create_scheduler(bot)
+    dp = create_dispatcher(scheduler, bot)
+    loopmon.start()
+
+    await init_db()
+    await seed_free_workouts_if_empty()
+    await load_admin_roles()
+    scheduler.start()
+    await resume_broadcasts(bot)
 
-    await dp.start_polling(bot)
+    if BOT_MODE == 'webhook':
+        await run_webhook(dp, bot)
+    else:
+        await start_metrics_server()
+        await dp.start_polling(bot)
 
 if __name__ == '__main__':
     asyncio.run(main())
@@ -0,0 +1,276 @@
+import bisect
+import contextvars
+import functools
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from aiohttp import web
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramAPIError
+from aiogram.methods import TelegramMethod
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+METRICS_PATH = os.getenv('METRICS_PATH', '/metrics')
+# окремий порт для /metrics у режимі polling (у webhook-режимі ендпоінт є на тому ж сервері)
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+JOB_BUCKETS = (0.1, 0.5, 1, 5, 15, 60, 300, 900, 3600)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50)
+
+
+# --- Мінімальні метрики у форматі Prometheus ---
+class Counter:
+    def __init__(self, name: str, doc: str):
+        self.name, self.doc = name, doc
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        yield f'# HELP {self.name} {self.doc}'
+        yield f'# TYPE {self.name} counter'
+        for key, value in self.values.items():
+            yield f'{self.name}{_labels(key)} {value}'
+
+
+class Gauge(Counter):
+    def set(self, value: float, **labels: str) -> None:
+        self.values[tuple(sorted(labels.items()))] = value
+
+    def render(self):
+        yield f'# HELP {self.name} {self.doc}'
+        yield f'# TYPE {self.name} gauge'
+        for key, value in self.values.items():
+            yield f'{self.name}{_labels(key)} {value}'
+
+
+class Histogram:
+    def __init__(self, name: str, doc: str, buckets=LATENCY_BUCKETS):
+        self.name, self.doc = name, doc
+        self.buckets = tuple(buckets)
+        # labels -> [лічильники по бакетах (+Inf останній), сума, кількість]
+        self.values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        series = self.values.get(key)
+        if series is None:
+            series = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def quantile(self, q: float, **labels: str) -> Optional[float]:
+        """Оцінка квантиля за бакетами (верхня межа бакета, куди він потрапляє)."""
+        series = self.values.get(tuple(sorted(labels.items())))
+        if not series or not series[2]:
+            return None
+        rank, seen = q * series[2], 0
+        for i, count in enumerate(series[0]):
+            seen += count
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else float('inf')
+        return float('inf')
+
+    def render(self):
+        yield f'# HELP {self.name} {self.doc}'
+        yield f'# TYPE {self.name} histogram'
+        for key, (counts, total, n) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                yield f'{self.name}_bucket{_labels(key + (("le", str(bound)),))} {cumulative}'
+            yield f'{self.name}_sum{_labels(key)} {total}'
+            yield f'{self.name}_count{_labels(key)} {n}'
+
+
+def _labels(key: Tuple) -> str:
+    if not key:
+        return ''
+    return '{' + ','.join(f'{k}="{str(v)}"' for k, v in key) + '}'
+
+
+update_seconds = Histogram('yogaxbot_update_seconds', 'Час обробки апдейту за хендлером')
+update_db_queries = Histogram('yogaxbot_update_db_queries', 'Кількість SQL-запитів на апдейт', COUNT_BUCKETS)
+update_db_seconds = Histogram('yogaxbot_update_db_seconds', 'Сумарний час SQL-запитів на апдейт')
+db_query_seconds = Histogram('yogaxbot_db_query_seconds', 'Час одного SQL-запиту')
+api_seconds = Histogram('yogaxbot_telegram_api_seconds', 'Час виклику Bot API за методом')
+api_errors = Counter('yogaxbot_telegram_api_errors_total', 'Помилки Bot API за методом і типом')
+job_seconds = Histogram('yogaxbot_job_seconds', 'Тривалість фонової задачі', JOB_BUCKETS)
+job_items = Counter('yogaxbot_job_items_total', 'Оброблено елементів фоновою задачею')
+job_failures = Counter('yogaxbot_job_failures_total', 'Падіння фонової задачі')
+job_last_items = Gauge('yogaxbot_job_last_items', 'Елементів за останній запуск задачі')
+outbound_wait_seconds = Histogram('yogaxbot_outbound_wait_seconds', 'Очікування в черзі відправки за пріоритетом')
+outbound_queue = Gauge('yogaxbot_outbound_queue', 'Відправок у черзі за пріоритетом')
+outbound_retries = Counter('yogaxbot_outbound_retries_total', 'Повтори відправки за пріоритетом і причиною')
+blocked_marked = Counter('yogaxbot_blocked_users_marked_total', 'Користувачі, позначені як такі, що заблокували бота')
+throttled_updates = Counter('yogaxbot_throttled_updates_total', 'Відкинуті апдейти (флуд-контроль) за хендлером і причиною')
+loop_lag_seconds = Histogram('yogaxbot_loop_lag_seconds', 'Запізнення циклу подій (пульс loopmon)')
+loop_stalls = Counter('yogaxbot_loop_stalls_total', 'Блокування циклу подій довше порогу за місцем у коді')
+
+REGISTRY = [update_seconds, update_db_queries, update_db_seconds, db_query_seconds,
+            api_seconds, api_errors, job_seconds, job_items, job_failures, job_last_items, throttled_updates,
+            blocked_marked, outbound_wait_seconds, outbound_queue, outbound_retries, loop_lag_seconds, loop_stalls]
+
+
+def render() -> str:
+    return '\n'.join(line for metric in REGISTRY for line in metric.render()) + '\n'
+
+
+# --- Статистика поточного апдейту ---
+class UpdateStats:
+    __slots__ = ('handler', 'db_queries', 'db_seconds')
+
+    def __init__(self):
+        self.handler = 'unhandled'
+        self.db_queries = 0
+        self.db_seconds = 0.0
+
+
+_current: contextvars.ContextVar[Optional[UpdateStats]] = contextvars.ContextVar('yogaxbot_update_stats', default=None)
+
+
+def instrument_engine(engine) -> None:
+    """Рахує SQL-запити через події SQLAlchemy (для AsyncEngine — на його sync_engine)."""
+    sync_engine = getattr(engine, 'sync_engine', engine)
+
+    @event.listens_for(sync_engine, 'before_cursor_execute')
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('yogaxbot_query_start', []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, 'after_cursor_execute')
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['yogaxbot_query_start'].pop()
+        db_query_seconds.observe(elapsed)
+        stats = _current.get()
+        if stats is not None:
+            stats.db_queries += 1
+            stats.db_seconds += elapsed
+
+
+async def metrics_middleware(handler, event, data):
+    """Зовнішній middleware апдейтів: латентність за хендлером і SQL на апдейт."""
+    stats = UpdateStats()
+    token = _current.set(stats)
+    started = time.perf_counter()
+    try:
+        return await handler(event, data)
+    finally:
+        _current.reset(token)
+        update_seconds.observe(time.perf_counter() - started, handler=stats.handler)
+        update_db_queries.observe(stats.db_queries, handler=stats.handler)
+        update_db_seconds.observe(stats.db_seconds, handler=stats.handler)
+
+
+async def handler_name_middleware(handler, event, data):
+    # внутрішній middleware: тут уже відомо, який хендлер обрано
+    stats = _current.get()
+    handler_obj = data.get('handler')
+    if stats is not None and handler_obj is not None:
+        stats.handler = getattr(handler_obj.callback, '__name__', 'handler')
+    return await handler(event, data)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сесії бота: латентність і помилки викликів Bot API за методом."""
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod):
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except TelegramAPIError as e:
+            api_errors.inc(method=method.__api_method__, error=type(e).__name__)
+            raise
+        finally:
+            api_seconds.observe(time.perf_counter() - started, method=method.__api_method__)
+
+
+def setup_metrics(dp, bot: Bot, engine) -> None:
+    dp.update.outer_middleware.register(metrics_middleware)
+    dp.message.middleware.register(handler_name_middleware)
+    dp.callback_query.middleware.register(handler_name_middleware)
+    bot.session.middleware(ApiMetricsMiddleware())
+    instrument_engine(engine)
+
+
+def track_job(name: str):
+    """Декоратор фонової задачі: тривалість, кількість оброблених елементів (результат задачі), падіння."""
+    def decorator(func: Callable[..., Awaitable[Any]]):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                items = await func(*args, **kwargs)
+            except Exception:
+                job_failures.inc(job=name)
+                raise
+            finally:
+                job_seconds.observe(time.perf_counter() - started, job=name)
+            if isinstance(items, int):
+                job_items.inc(items, job=name)
+                job_last_items.set(items, job=name)
+            return items
+        return wrapper
+    return decorator
+
+
+# --- HTTP-ендпоінт і зведення для адмінки ---
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=render(), content_type='text/plain', charset='utf-8',
+                        headers={'X-Content-Type-Options': 'nosniff'})
+
+
+async def start_metrics_server(host: str = '0.0.0.0', port: int = METRICS_PORT) -> Optional[web.AppRunner]:
+    if not port:
+        return None
+    app = web.Application()
+    app.router.add_get(METRICS_PATH, metrics_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("Metrics served on %s:%s%s", host, port, METRICS_PATH)
+    return runner
+
+
+def _ms(value: Optional[float]) -> str:
+    if value is None:
+        return '—'
+    return '∞' if value == float('inf') else f'{value * 1000:.0f}мс'
+
+
+def summary(top: int = 8) -> str:
+    lines = ['<b>Хендлери</b> (к-сть, сер., p95, SQL/апдейт):']
+    by_count = sorted(update_seconds.values.items(), key=lambda kv: kv[1][2], reverse=True)[:top]
+    for key, (_, total, n) in by_count:
+        labels = dict(key)
+        queries = update_db_queries.values.get(key)
+        avg_q = queries[1] / queries[2] if queries and queries[2] else 0
+        lines.append(f'• {labels.get("handler")}: {n}, {_ms(total / n)}, '
+                     f'{_ms(update_seconds.quantile(0.95, **labels))}, {avg_q:.1f}')
+    lines.append('\n<b>Bot API</b> (к-сть, сер., помилки):')
+    errors_by_method: Dict[str, float] = {}
+    for key, value in api_errors.values.items():
+        method = dict(key)['method']
+        errors_by_method[method] = errors_by_method.get(method, 0) + value
+    for key, (_, total, n) in sorted(api_seconds.values.items(), key=lambda kv: kv[1][2], reverse=True)[:top]:
+        method = dict(key)['method']
+        lines.append(f'• {method}: {n}, {_ms(total / n)}, {int(errors_by_method.get(method, 0))}')
+    lines.append('\n<b>Черга відправки</b> (відправок, сер. і p95 очікування, у черзі):')
+    for key, (_, total, n) in sorted(outbound_wait_seconds.values.items()):
+        labels = dict(key)
+        queued = outbound_queue.values.get(key, 0)
+        lines.append(f'• {labels["priority"]}: {n}, {_ms(total / n)}, '
+                     f'{_ms(outbound_wait_seconds.quantile(0.95, **labels))}, {int(queued)}')
+    lines.append('\n<b>Фонові задачі</b> (запусків, сер. тривалість, елементів востаннє):')
+    for key, (_, total, n) in job_seconds.values.items():
+        job = dict(key)['job']
+        last = job_last_items.values.get(key)
+        lines.append(f'• {job}: {n}, {_ms(total / n)}, {int(last) if last is not None else "—"}')
+    return '\n'.join(lines)
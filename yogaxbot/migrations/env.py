@@ -0,0 +1,51 @@
+import asyncio
+import os
+import sys
+from logging.config import fileConfig
+from alembic import context
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+load_dotenv()
+
+from db import Base, engine, ASYNC_DB_URL  # noqa: E402
+
+config = context.config
+target_metadata = Base.metadata
+
+
+def run_migrations_offline() -> None:
+    context.configure(url=ASYNC_DB_URL, target_metadata=target_metadata,
+                      literal_binds=True, dialect_opts={'paramstyle': 'named'}, render_as_batch=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection) -> None:
+    context.configure(connection=connection, target_metadata=target_metadata, render_as_batch=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_async_migrations() -> None:
+    async with engine.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+        await connection.commit()
+    await engine.dispose()
+
+
+def run_migrations_online() -> None:
+    # db.init_db() передає вже відкрите з'єднання, коли накочує міграції при старті бота
+    connection = config.attributes.get('connection')
+    if connection is not None:
+        do_run_migrations(connection)
+        return
+    if config.config_file_name is not None:
+        fileConfig(config.config_file_name)
+    asyncio.run(run_async_migrations())
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,83 @@
+"""initial schema
+
+Схема, яку раніше створював Base.metadata.create_all(). Для бази, створеної
+старою версією бота, достатньо `alembic stamp 0001`.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 10:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'users',
+        sa.Column('user_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('trial_started_at', sa.DateTime(), nullable=True),
+        sa.Column('trial_expires_at', sa.DateTime(), nullable=True),
+        sa.Column('last_reminder_at', sa.DateTime(), nullable=True),
+        sa.Column('extension_used', sa.Boolean(), nullable=False),
+        sa.Column('blocked', sa.Boolean(), nullable=False),
+        sa.Column('start_pending_at', sa.DateTime(), nullable=True),
+        sa.Column('pinned_menu_message_id', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('user_id'),
+    )
+    op.create_table(
+        'text_blocks',
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.PrimaryKeyConstraint('key'),
+    )
+    op.create_table(
+        'workout_catalogs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('code', sa.String(), nullable=False),
+        sa.Column('caption', sa.Text(), nullable=False),
+        sa.Column('url', sa.String(), nullable=True),
+        sa.Column('photo_file_id', sa.String(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('code'),
+    )
+    op.create_table(
+        'broadcast_logs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('payload_preview', sa.Text(), nullable=True),
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.Column('success', sa.Integer(), nullable=False),
+        sa.Column('failed', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'workout_messages',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('chat_id', sa.Integer(), nullable=False),
+        sa.Column('message_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.user_id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('workout_messages')
+    op.drop_table('broadcast_logs')
+    op.drop_table('workout_catalogs')
+    op.drop_table('text_blocks')
+    op.drop_table('users')
@@ -0,0 +1,61 @@
+"""broadcasts as resumable jobs
+
+- broadcast_logs: статус задачі, повний текст/фото, чат адміна для звіту, час завершення;
+- broadcast_deliveries: рядок на кожного одержувача зі статусом доставки.
+
+Розсилки, що вже є в базі, завершені — отримують статус done.
+
+Revision ID: 0001a
+Revises: 0001
+Create Date: 2026-10-18 10:02:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001a'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# id Telegram: bigint у PostgreSQL, INTEGER (64 біти) у SQLite — як db.TelegramId
+TELEGRAM_ID = sa.BigInteger().with_variant(sa.Integer(), 'sqlite')
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('broadcast_logs') as batch_op:
+        batch_op.add_column(sa.Column('status', sa.String(), nullable=False, server_default='done'))
+        batch_op.add_column(sa.Column('payload', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('photo_file_id', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('admin_chat_id', TELEGRAM_ID, nullable=True))
+        batch_op.add_column(sa.Column('finished_at', sa.DateTime(), nullable=True))
+    with op.batch_alter_table('broadcast_logs') as batch_op:
+        batch_op.alter_column('status', server_default=None)
+    op.create_table(
+        'broadcast_deliveries',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('broadcast_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', TELEGRAM_ID, nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['broadcast_id'], ['broadcast_logs.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('broadcast_id', 'user_id'),
+    )
+    op.create_index('ix_broadcast_deliveries_claim', 'broadcast_deliveries', ['broadcast_id', 'status', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_broadcast_deliveries_claim', table_name='broadcast_deliveries')
+    op.drop_table('broadcast_deliveries')
+    with op.batch_alter_table('broadcast_logs') as batch_op:
+        batch_op.drop_column('finished_at')
+        batch_op.drop_column('admin_chat_id')
+        batch_op.drop_column('photo_file_id')
+        batch_op.drop_column('payload')
+        batch_op.drop_column('status')
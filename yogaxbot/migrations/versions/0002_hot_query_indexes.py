@@ -0,0 +1,40 @@
+"""indexes for hot queries
+
+- users(status, trial_expires_at): завершення тріалів у trial_maintenance;
+- users(status, last_reminder_at): вибірка нагадувань, що настали;
+- users(trial_expires_at): join у purge_workouts;
+- workout_messages(user_id): повідомлення користувача при очищенні;
+- workout_catalogs(is_active, id): знімок активного каталогу.
+
+Revision ID: 0002
+Revises: 0001a
+Create Date: 2026-10-18 10:05:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_users_status_trial_expires_at', 'users', ['status', 'trial_expires_at'])
+    op.create_index('ix_users_status_last_reminder_at', 'users', ['status', 'last_reminder_at'])
+    op.create_index('ix_users_trial_expires_at', 'users', ['trial_expires_at'])
+    op.create_index('ix_workout_messages_user_id', 'workout_messages', ['user_id'])
+    op.create_index('ix_workout_catalogs_is_active_id', 'workout_catalogs', ['is_active', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_workout_catalogs_is_active_id', table_name='workout_catalogs')
+    op.drop_index('ix_workout_messages_user_id', table_name='workout_messages')
+    op.drop_index('ix_users_trial_expires_at', table_name='users')
+    op.drop_index('ix_users_status_last_reminder_at', table_name='users')
+    op.drop_index('ix_users_status_trial_expires_at', table_name='users')
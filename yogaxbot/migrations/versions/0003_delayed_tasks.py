@@ -0,0 +1,42 @@
+"""delayed tasks queue
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 11:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# id Telegram: bigint у PostgreSQL, INTEGER (64 біти) у SQLite — як db.TelegramId
+TELEGRAM_ID = sa.BigInteger().with_variant(sa.Integer(), 'sqlite')
+
+
+def upgrade() -> None:
+    op.create_table(
+        'delayed_tasks',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('user_id', TELEGRAM_ID, nullable=False),
+        sa.Column('chat_id', TELEGRAM_ID, nullable=False),
+        sa.Column('run_at', sa.DateTime(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('kind', 'user_id'),
+    )
+    op.create_index('ix_delayed_tasks_run_at', 'delayed_tasks', ['run_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_delayed_tasks_run_at', table_name='delayed_tasks')
+    op.drop_table('delayed_tasks')
@@ -0,0 +1,34 @@
+"""indexes that skip users who blocked the bot
+
+- users(status, blocked, last_reminder_at): нагадування лише тим, хто не заблокував бота
+  (замінює users(status, last_reminder_at));
+- users(blocked, user_id): keyset-вибірка одержувачів розсилки без заблокованих.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 11:40:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.drop_index('ix_users_status_last_reminder_at', table_name='users')
+    op.create_index('ix_users_status_blocked_last_reminder_at', 'users', ['status', 'blocked', 'last_reminder_at'])
+    op.create_index('ix_users_blocked_user_id', 'users', ['blocked', 'user_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_users_blocked_user_id', table_name='users')
+    op.drop_index('ix_users_status_blocked_last_reminder_at', table_name='users')
+    op.create_index('ix_users_status_last_reminder_at', 'users', ['status', 'last_reminder_at'])
@@ -0,0 +1,67 @@
+"""incrementally maintained stats counters
+
+- user_status_counts: кількість користувачів за статусом (заповнюється з users);
+- daily_stats: денні лічильники; trials_started і broadcast_* відновлюються з наявних
+  даних, reminders_sent і trials_expired рахуються з моменту міграції.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 12:40:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'user_status_counts',
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('users', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('status'),
+    )
+    op.create_table(
+        'daily_stats',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('value', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'name'),
+    )
+    op.execute(
+        "INSERT INTO user_status_counts (status, users) "
+        "SELECT status, COUNT(*) FROM users GROUP BY status"
+    )
+    op.execute(
+        "INSERT INTO daily_stats (day, name, value) "
+        "SELECT date(trial_started_at), 'trials_started', COUNT(*) FROM users "
+        "WHERE trial_started_at IS NOT NULL GROUP BY date(trial_started_at)"
+    )
+    op.execute(
+        "INSERT INTO daily_stats (day, name, value) "
+        "SELECT date(created_at), 'broadcasts', COUNT(*) FROM broadcast_logs "
+        "GROUP BY date(created_at)"
+    )
+    op.execute(
+        "INSERT INTO daily_stats (day, name, value) "
+        "SELECT date(created_at), 'broadcast_sent', COALESCE(SUM(success), 0) FROM broadcast_logs "
+        "GROUP BY date(created_at)"
+    )
+    op.execute(
+        "INSERT INTO daily_stats (day, name, value) "
+        "SELECT date(created_at), 'broadcast_failed', COALESCE(SUM(failed), 0) FROM broadcast_logs "
+        "GROUP BY date(created_at)"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('daily_stats')
+    op.drop_table('user_status_counts')
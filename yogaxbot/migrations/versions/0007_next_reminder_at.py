@@ -0,0 +1,42 @@
+"""per-user reminder schedule
+
+- users.next_reminder_at: коли надіслати наступне нагадування (тік бере лише тих, чий час настав);
+- users(status, blocked, next_reminder_at) замінює users(status, blocked, last_reminder_at).
+
+Для активних тріалів час заповнюється з last_reminder_at + 3 дні з розкидом до години
+за user_id, щоб накопичені нагадування не пішли одним сплеском.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 13:30:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('next_reminder_at', sa.DateTime(), nullable=True))
+    if op.get_bind().dialect.name == 'sqlite':
+        due = "datetime(COALESCE(last_reminder_at, CURRENT_TIMESTAMP), '+3 days', '+' || (user_id % 3600) || ' seconds')"
+    else:
+        due = "COALESCE(last_reminder_at, now()) + interval '3 days' + (user_id % 3600) * interval '1 second'"
+    op.execute(f"UPDATE users SET next_reminder_at = {due} WHERE status = 'trial_active'")
+    op.drop_index('ix_users_status_blocked_last_reminder_at', table_name='users')
+    op.create_index('ix_users_status_blocked_next_reminder_at', 'users', ['status', 'blocked', 'next_reminder_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_users_status_blocked_next_reminder_at', table_name='users')
+    op.create_index('ix_users_status_blocked_last_reminder_at', 'users', ['status', 'blocked', 'last_reminder_at'])
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('next_reminder_at')
@@ -0,0 +1,28 @@
+"""index for retention of workout_messages
+
+- workout_messages(created_at): щоденне прибирання старих записів порціями (retention.py).
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 14:20:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_workout_messages_created_at', 'workout_messages', ['created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_workout_messages_created_at', table_name='workout_messages')
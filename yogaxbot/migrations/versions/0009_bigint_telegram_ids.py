@@ -0,0 +1,43 @@
+"""bigint for Telegram user and chat ids in the baseline tables
+
+id користувачів і чатів Telegram не вміщаються в int4. Колонки з 0001 (базова схема,
+яка вже є в продакшні) у PostgreSQL переводяться в bigint; нові таблиці (0001a, 0003)
+одразу створюються з bigint. У SQLite INTEGER і так 64-бітний — нічого не змінюється.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 15:10:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = (
+    ('users', 'user_id', False),
+    ('workout_messages', 'user_id', False),
+    ('workout_messages', 'chat_id', False),
+)
+
+
+def _alter(from_type, to_type) -> None:
+    if op.get_bind().dialect.name == 'sqlite':
+        return
+    for table, column, nullable in COLUMNS:
+        op.alter_column(table, column, existing_type=from_type, type_=to_type, existing_nullable=nullable)
+
+
+def upgrade() -> None:
+    _alter(sa.Integer(), sa.BigInteger())
+
+
+def downgrade() -> None:
+    _alter(sa.BigInteger(), sa.Integer())
@@ -0,0 +1,31 @@
+"""part of the open course for workout_messages
+
+- workout_messages.part: intro / workout:<id> / links — повтор задачі start_open_course
+  після збою досилає лише те, чого ще немає.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 16:30:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0010'
+down_revision: Union[str, None] = '0009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('workout_messages') as batch_op:
+        batch_op.add_column(sa.Column('part', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('workout_messages') as batch_op:
+        batch_op.drop_column('part')
@@ -0,0 +1,94 @@
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from contextlib import contextmanager
+from enum import IntEnum
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter, TelegramServerError
+from aiogram.methods import TelegramMethod
+from ratelimit import PriorityTokenBucket, ChatRateLimiter
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# --- Спільний ліміт відправки для всього бота ---
+# Telegram дозволяє ~30 повідомлень/с на бота і ~1/с в один чат (короткі бурсти допустимі)
+OUTBOUND_RATE = float(os.getenv('OUTBOUND_RATE', '25'))
+OUTBOUND_BURST = float(os.getenv('OUTBOUND_BURST', '25'))
+OUTBOUND_CHAT_RATE = float(os.getenv('OUTBOUND_CHAT_RATE', '1'))
+OUTBOUND_CHAT_BURST = int(os.getenv('OUTBOUND_CHAT_BURST', '3'))
+OUTBOUND_MAX_RETRIES = int(os.getenv('OUTBOUND_MAX_RETRIES', '3'))
+OUTBOUND_BACKOFF = float(os.getenv('OUTBOUND_BACKOFF', '0.5'))
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0   # відповіді на дії користувача
+    ONBOARDING = 1    # відкладений старт курсу
+    REMINDER = 2
+    BULK = 3          # розсилки, видалення старих тренувань
+
+
+_priority = contextvars.ContextVar('outbound_priority', default=Priority.INTERACTIVE)
+
+
+@contextmanager
+def priority(value: Priority):
+    """Клас відправки для всіх викликів Bot API всередині блоку (і в задачах, створених у ньому)."""
+    token = _priority.set(value)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class OutboundMiddleware(BaseRequestMiddleware):
+    """Middleware сесії бота, через який проходить кожна відправка в чат.
+
+    Виклики з `chat_id` чекають на токен глобального ліміту (за пріоритетом) і на ліміт
+    чату; RetryAfter призупиняє всю відправку, 5xx повторюються з експоненційною паузою.
+    Решта методів (getUpdates, answerCallbackQuery, ...) проходять без черги.
+    """
+
+    def __init__(self, rate: float = OUTBOUND_RATE, burst: float = OUTBOUND_BURST,
+                 chat_rate: float = OUTBOUND_CHAT_RATE, chat_burst: int = OUTBOUND_CHAT_BURST):
+        self.bucket = PriorityTokenBucket(rate, burst)
+        self.chats = ChatRateLimiter(chat_rate, chat_burst)
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod):
+        chat_id = getattr(method, 'chat_id', None)
+        if chat_id is None:
+            return await make_request(bot, method)
+        prio = _priority.get()
+        label = prio.name.lower()
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            await self.chats.wait(chat_id)
+            await self.bucket.acquire(prio)
+            metrics.outbound_wait_seconds.observe(time.perf_counter() - started, priority=label)
+            metrics.outbound_queue.set(self.bucket.waiting[prio], priority=label)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                attempt += 1
+                metrics.outbound_retries.inc(priority=label, reason='retry_after')
+                if attempt > OUTBOUND_MAX_RETRIES:
+                    raise
+                logger.warning("RetryAfter %ss on %s chat_id=%s (attempt %s)",
+                               e.retry_after, method.__api_method__, chat_id, attempt)
+                self.bucket.pause(e.retry_after)
+            except TelegramServerError:
+                attempt += 1
+                metrics.outbound_retries.inc(priority=label, reason='server_error')
+                if attempt > OUTBOUND_MAX_RETRIES:
+                    raise
+                await asyncio.sleep(OUTBOUND_BACKOFF * 2 ** (attempt - 1))
+
+
+def setup_outbound(bot: Bot) -> OutboundMiddleware:
+    middleware = OutboundMiddleware()
+    bot.session.middleware(middleware)
+    return middleware
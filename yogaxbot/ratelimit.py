@@ -0,0 +1,118 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+
+class PriorityTokenBucket:
+    """Глобальний ліміт: не більше `rate` дій на секунду з бурстом до `capacity`.
+
+    Токени видаються за пріоритетом (менше число — раніше), у межах одного
+    пріоритету — у порядку черги. Масові відправки отримують токен лише тоді,
+    коли ніхто важливіший не чекає.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._pump_task = None
+        self.waiting = Counter()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def pause(self, seconds: float) -> None:
+        # RetryAfter від Telegram стосується всього бота — зупиняємо всіх відправників
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self, priority: int = 0) -> None:
+        now = time.monotonic()
+        if not self._waiters and now >= self._paused_until:
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self.waiting[priority] += 1
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.create_task(self._pump())
+        try:
+            await future
+        finally:
+            self.waiting[priority] -= 1
+
+    async def _pump(self) -> None:
+        while self._waiters:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            self._refill(now)
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():  # скасований очікувач токен не забирає
+                self._tokens -= 1
+                future.set_result(None)
+
+
+class ChatRateLimiter:
+    """Ліміт на один чат: у середньому `rate` повідомлень на секунду, підряд — до `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.interval = 1.0 / float(rate)
+        self.burst = max(1, int(burst))
+        # chat_id -> момент, коли «віртуальна» черга чату спорожніє
+        self._free_at = {}
+
+    async def wait(self, chat_id: int) -> None:
+        now = time.monotonic()
+        # бурст: дозволяємо випередити розклад не більше ніж на (burst - 1) інтервалів
+        free_at = max(self._free_at.get(chat_id, now), now)
+        start_at = max(now, free_at - (self.burst - 1) * self.interval)
+        self._free_at[chat_id] = free_at + self.interval
+        if start_at > now:
+            await asyncio.sleep(start_at - now)
+        if len(self._free_at) > 10000:
+            self._evict(time.monotonic())
+
+    def _evict(self, now: float) -> None:
+        for chat_id in [c for c, t in self._free_at.items() if t <= now]:
+            del self._free_at[chat_id]
+
+
+async def run_limited(items, func, concurrency: int):
+    """Викликає `await func(item)` для всіх елементів, не більше `concurrency` одночасно.
+
+    Повертає список пар (item, результат або виняток) у порядку завершення.
+    """
+    queue = asyncio.Queue()
+    for item in items:
+        queue.put_nowait(item)
+    results = []
+
+    async def worker():
+        while True:
+            try:
+                item = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                results.append((item, await func(item)))
+            except Exception as e:
+                results.append((item, e))
+
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, queue.qsize())))))
+    return results
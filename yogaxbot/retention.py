@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, exists, func
+from db import engine, SessionLocal, WorkoutMessage, BroadcastLog, BroadcastDelivery
+from metrics import track_job
+
+logger = logging.getLogger(__name__)
+
+# Політики зберігання (днів; 0 — не чистити). Видалення йде маленькими порціями з окремим
+# комітом на кожну, щоб не тримати довгих блокувань під час роботи бота.
+RETENTION_WORKOUT_DAYS = int(os.getenv('RETENTION_WORKOUT_DAYS', '45'))
+RETENTION_DELIVERY_DAYS = int(os.getenv('RETENTION_DELIVERY_DAYS', '14'))
+RETENTION_BROADCAST_DAYS = int(os.getenv('RETENTION_BROADCAST_DAYS', '365'))
+RETENTION_CHUNK = int(os.getenv('RETENTION_CHUNK', '500'))
+RETENTION_MAX_CHUNKS = int(os.getenv('RETENTION_MAX_CHUNKS', '200'))
+RETENTION_PAUSE = float(os.getenv('RETENTION_PAUSE', '0.05'))
+RETENTION_HOUR = int(os.getenv('RETENTION_HOUR', '3'))
+# Повернення місця (лише SQLite) раз на тиждень: день тижня у форматі cron (mon..sun), година UTC.
+# Звичайно це PRAGMA incremental_vacuum малими порціями; повний VACUUM (блокує базу на весь час
+# перезапису файлу) — лише один раз, щоб увімкнути auto_vacuum=INCREMENTAL на наявній базі.
+DB_VACUUM_DAY = os.getenv('DB_VACUUM_DAY', 'sun')
+DB_VACUUM_HOUR = int(os.getenv('DB_VACUUM_HOUR', '4'))
+DB_VACUUM_PAGES = int(os.getenv('DB_VACUUM_PAGES', '2000'))
+
+
+async def _delete_chunked(model, ids_query) -> int:
+    """Видаляє рядки `model`, id яких повертає `ids_query`, порціями по RETENTION_CHUNK."""
+    deleted = 0
+    for _ in range(RETENTION_MAX_CHUNKS):
+        async with SessionLocal() as session:
+            ids = (await session.execute(ids_query.limit(RETENTION_CHUNK))).scalars().all()
+            if ids:
+                await session.execute(delete(model).where(model.id.in_(ids)))
+                await session.commit()
+        deleted += len(ids)
+        if len(ids) < RETENTION_CHUNK:
+            break
+        # пауза між порціями — дати пройти записам з апдейтів
+        await asyncio.sleep(RETENTION_PAUSE)
+    if deleted:
+        logger.info("retention: %s rows deleted from %s", deleted, model.__tablename__)
+    return deleted
+
+
+async def _purge_workout_messages(now: datetime) -> int:
+    # тренування, які purge_workouts не прибрав: користувач без тріалу або Telegram відмовив
+    # видаляти (бот може видаляти лише повідомлення, молодші за 48 год)
+    cutoff = now - timedelta(days=RETENTION_WORKOUT_DAYS)
+    return await _delete_chunked(WorkoutMessage, select(WorkoutMessage.id)
+                                 .where(WorkoutMessage.created_at < cutoff).order_by(WorkoutMessage.id))
+
+
+def _finished_at():
+    # у розсилок, завершених до появи finished_at, є лише created_at
+    return func.coalesce(BroadcastLog.finished_at, BroadcastLog.created_at)
+
+
+async def _purge_deliveries(now: datetime) -> int:
+    # по одному рядку на одержувача; підсумки лишаються в broadcast_logs і daily_stats
+    cutoff = now - timedelta(days=RETENTION_DELIVERY_DAYS)
+    async with SessionLocal() as session:
+        log_ids = (await session.execute(select(BroadcastLog.id).where(
+            BroadcastLog.status == 'done', _finished_at() < cutoff))).scalars().all()
+    deleted = 0
+    for log_id in log_ids:
+        deleted += await _delete_chunked(BroadcastDelivery, select(BroadcastDelivery.id)
+                                         .where(BroadcastDelivery.broadcast_id == log_id))
+    return deleted
+
+
+async def _purge_broadcast_logs(now: datetime) -> int:
+    # денні підсумки розсилок уже є в daily_stats (broadcasts, broadcast_sent, broadcast_failed)
+    cutoff = now - timedelta(days=RETENTION_BROADCAST_DAYS)
+    return await _delete_chunked(BroadcastLog, select(BroadcastLog.id).where(
+        BroadcastLog.status == 'done', _finished_at() < cutoff,
+        ~exists().where(BroadcastDelivery.broadcast_id == BroadcastLog.id),
+    ).order_by(BroadcastLog.id))
+
+
+async def analyze() -> None:
+    """Оновлює статистику планувальника запитів після масових видалень."""
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level='AUTOCOMMIT')
+        await conn.exec_driver_sql('PRAGMA optimize' if engine.dialect.name == 'sqlite' else 'ANALYZE')
+
+
+@track_job('retention')
+async def run_retention() -> int:
+    """Щоденне прибирання за політиками RETENTION_*; повертає кількість видалених рядків."""
+    now = datetime.utcnow()
+    deleted = 0
+    if RETENTION_WORKOUT_DAYS:
+        deleted += await _purge_workout_messages(now)
+    if RETENTION_DELIVERY_DAYS:
+        deleted += await _purge_deliveries(now)
+    if RETENTION_BROADCAST_DAYS:
+        deleted += await _purge_broadcast_logs(now)
+    await analyze()
+    return deleted
+
+
+@track_job('db_vacuum')
+async def vacuum_db() -> int:
+    """SQLite: повертає вільні сторінки файлу порціями. На PostgreSQL це робить autovacuum.
+
+    Повертає кількість звільнених сторінок.
+    """
+    if engine.dialect.name != 'sqlite':
+        return 0
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level='AUTOCOMMIT')
+        if (await conn.exec_driver_sql('PRAGMA auto_vacuum')).scalar() != 2:
+            # 2 = INCREMENTAL; режим набуває чинності лише після повного VACUUM
+            logger.warning("db_vacuum: enabling incremental auto_vacuum, full VACUUM once (database locked meanwhile)")
+            await conn.exec_driver_sql('PRAGMA auto_vacuum = INCREMENTAL')
+            await conn.exec_driver_sql('VACUUM')
+            return 0
+    freed = 0
+    for _ in range(RETENTION_MAX_CHUNKS):
+        # кожна порція — окреме коротке блокування; між ними проходять записи з апдейтів
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level='AUTOCOMMIT')
+            free = (await conn.exec_driver_sql('PRAGMA freelist_count')).scalar()
+            if not free:
+                break
+            # sqlite3 у execute() робить лише один крок прагми (одна сторінка), executescript — до кінця
+            raw = await conn.get_raw_connection()
+            await raw.driver_connection.executescript(f'PRAGMA incremental_vacuum({DB_VACUUM_PAGES});')
+        freed += min(free, DB_VACUUM_PAGES)
+        await asyncio.sleep(RETENTION_PAUSE)
+    if freed:
+        logger.info("db_vacuum: %s pages freed", freed)
+    return freed
@@ -0,0 +1,90 @@
+import logging
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, select, delete
+from db import User, UserStatusCount, DailyStat, dialect_insert
+
+logger = logging.getLogger(__name__)
+
+# Лічильники оновлюються в тій самій транзакції, що й подія, атомарним upsert-ом
+# (value = value + N), тож адмінка читає готові рядки без COUNT(*) по великих таблицях.
+
+STATUS_TITLES = {
+    'new': 'Нові',
+    'trial_active': 'Тріал активний',
+    'trial_expired': 'Тріал завершено',
+    'admin': 'Адміни',
+}
+DAILY_TITLES = {
+    'trials_started': 'Тріалів почато',
+    'trials_expired': 'Тріалів завершено',
+    'reminders_sent': 'Нагадувань',
+    'broadcasts': 'Розсилок',
+    'broadcast_sent': 'Доставлено в розсилках',
+    'broadcast_failed': 'Помилок у розсилках',
+    'workouts_undeletable': 'Тренувань не вдалося видалити',
+}
+STATS_DAYS = 7
+
+
+async def bump(session, name: str, amount: int = 1, day: date = None) -> None:
+    """Додає `amount` до денного лічильника `name` (за замовчуванням — сьогодні, UTC)."""
+    if not amount:
+        return
+    stmt = dialect_insert(DailyStat).values(day=day or datetime.utcnow().date(), name=name, value=amount)
+    await session.execute(stmt.on_conflict_do_update(
+        index_elements=['day', 'name'], set_={'value': DailyStat.value + stmt.excluded.value}))
+
+
+async def _add_status(session, status: str, amount: int) -> None:
+    stmt = dialect_insert(UserStatusCount).values(status=status, users=amount)
+    await session.execute(stmt.on_conflict_do_update(
+        index_elements=['status'], set_={'users': UserStatusCount.users + stmt.excluded.users}))
+
+
+async def user_created(session, status: str = 'new') -> None:
+    await _add_status(session, status, 1)
+
+
+async def status_changed(session, old: str, new: str, amount: int = 1) -> None:
+    if not amount or old == new:
+        return
+    await _add_status(session, old, -amount)
+    await _add_status(session, new, amount)
+
+
+async def recount_statuses(session) -> None:
+    """Перебудовує user_status_counts з users (одноразовий COUNT(*), якщо лічильники розійшлися)."""
+    rows = (await session.execute(select(User.status, func.count()).group_by(User.status))).all()
+    await session.execute(delete(UserStatusCount))
+    if rows:
+        await session.execute(dialect_insert(UserStatusCount), [{'status': s, 'users': n} for s, n in rows])
+    logger.info("user status counts rebuilt: %s", dict(rows))
+
+
+async def render(session) -> str:
+    statuses = (await session.execute(select(UserStatusCount.status, UserStatusCount.users)
+                                      .order_by(UserStatusCount.status))).all()
+    since = datetime.utcnow().date() - timedelta(days=STATS_DAYS - 1)
+    daily = (await session.execute(select(DailyStat.day, DailyStat.name, DailyStat.value)
+                                   .where(DailyStat.day >= since).order_by(DailyStat.day.desc()))).all()
+
+    lines = ['<b>Користувачі</b>']
+    for status, users in statuses:
+        lines.append(f'• {STATUS_TITLES.get(status, status)}: {users}')
+    lines.append(f'Усього: {sum(users for _, users in statuses)}')
+
+    by_day = {}
+    for day, name, value in daily:
+        by_day.setdefault(day, {})[name] = value
+    lines.append(f'\n<b>За {STATS_DAYS} днів</b>')
+    totals = {}
+    for day, values in by_day.items():
+        parts = [f'{DAILY_TITLES[n].lower()} {values[n]}' for n in DAILY_TITLES if values.get(n)]
+        lines.append(f'{day:%d.%m}: ' + ', '.join(parts))
+        for n, v in values.items():
+            totals[n] = totals.get(n, 0) + v
+    if not by_day:
+        lines.append('Подій ще не було.')
+    else:
+        lines.append('\n' + '\n'.join(f'{title}: {totals.get(n, 0)}' for n, title in DAILY_TITLES.items()))
+    return '\n'.join(lines)
@@ -0,0 +1,125 @@
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _rule(value: str) -> Tuple[int, float]:
+    """'3/10' -> не більше 3 апдейтів за 10 секунд."""
+    limit, window = value.split('/')
+    return int(limit), float(window)
+
+
+# Правила за ключем хендлера (flags={'throttle': 'start'}); решта — за THROTTLE_DEFAULT
+THROTTLE_RULES = {
+    'start': _rule(os.getenv('THROTTLE_START', '1/10')),
+    'menu': _rule(os.getenv('THROTTLE_MENU', '2/3')),
+}
+THROTTLE_DEFAULT = _rule(os.getenv('THROTTLE_DEFAULT', '5/2'))
+# 0 — вимкнути обмеження (наприклад, для бенчмарку)
+THROTTLE_ENABLED = os.getenv('THROTTLE_ENABLED', '1') == '1'
+# як часто прибирати вікна користувачів, що давно нічого не надсилали
+THROTTLE_EVICT_INTERVAL = float(os.getenv('THROTTLE_EVICT_INTERVAL', '60'))
+
+
+class SlidingWindowLimiter:
+    """Ковзні вікна в пам'яті: ключ -> час останніх дозволених подій.
+
+    Вікно користувача живе, поки він активний; неактивні прибираються
+    раз на `evict_interval` секунд, тож пам'ять залежить лише від кількості
+    активних зараз користувачів.
+    """
+
+    def __init__(self, evict_interval: float = THROTTLE_EVICT_INTERVAL):
+        self._events: Dict[Any, deque] = {}
+        self._windows: Dict[Any, float] = {}
+        self.evict_interval = evict_interval
+        self._next_evict = time.monotonic() + evict_interval
+
+    def hit(self, key: Any, limit: int, window: float, now: Optional[float] = None) -> bool:
+        """Реєструє подію; False — ліміт у вікні вже вичерпано."""
+        now = time.monotonic() if now is None else now
+        if now >= self._next_evict:
+            self.evict(now)
+        events = self._events.get(key)
+        if events is None:
+            events = self._events[key] = deque()
+            self._windows[key] = window
+        while events and events[0] <= now - window:
+            events.popleft()
+        if len(events) >= limit:
+            return False
+        events.append(now)
+        return True
+
+    def evict(self, now: Optional[float] = None) -> int:
+        now = time.monotonic() if now is None else now
+        idle = [key for key, events in self._events.items()
+                if not events or events[-1] <= now - self._windows[key]]
+        for key in idle:
+            del self._events[key]
+            del self._windows[key]
+        self._next_evict = now + self.evict_interval
+        return len(idle)
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+
+class ThrottlingMiddleware:
+    """Внутрішній middleware message/callback_query: відкидає повтори від одного користувача.
+
+    - ковзне вікно на (користувач, хендлер) за правилами THROTTLE_*;
+    - злиття дублікатів: поки ідентичний апдейт (той самий текст чи callback data)
+      ще обробляється, новий не запускає хендлер вдруге.
+    """
+
+    def __init__(self, limiter: Optional[SlidingWindowLimiter] = None):
+        self.limiter = limiter or SlidingWindowLimiter()
+        self._in_flight = set()
+
+    async def __call__(self, handler, event, data):
+        user = data.get('event_from_user')
+        if not THROTTLE_ENABLED or user is None:
+            return await handler(event, data)
+        handler_obj = data.get('handler')
+        name = getattr(getattr(handler_obj, 'callback', None), '__name__', 'handler')
+        key = get_flag(data, 'throttle') or name
+        payload = event.data if isinstance(event, CallbackQuery) else getattr(event, 'text', None)
+
+        dedup_key = (user.id, key, payload)
+        if dedup_key in self._in_flight:
+            return await self._drop(event, name, 'duplicate')
+        limit, window = THROTTLE_RULES.get(key, THROTTLE_DEFAULT)
+        if not self.limiter.hit((user.id, key), limit, window):
+            return await self._drop(event, name, 'rate')
+
+        self._in_flight.add(dedup_key)
+        try:
+            return await handler(event, data)
+        finally:
+            self._in_flight.discard(dedup_key)
+
+    async def _drop(self, event, name: str, reason: str) -> None:
+        metrics.throttled_updates.inc(handler=name, reason=reason)
+        logger.debug("throttled %s (%s) from user_id=%s", name, reason, event.from_user.id)
+        if isinstance(event, CallbackQuery):
+            # зняти «годинник» з кнопки, інакше клієнт чекатиме відповіді
+            try:
+                await event.answer()
+            except Exception:
+                pass
+        return None
+
+
+def setup_throttling(dp) -> ThrottlingMiddleware:
+    middleware = ThrottlingMiddleware()
+    dp.message.middleware.register(middleware)
+    dp.callback_query.middleware.register(middleware)
+    return middleware
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import os
+from typing import Any, Dict
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from metrics import METRICS_PATH, metrics_handler
+
+logger = logging.getLogger(__name__)
+
+# --- Налаштування webhook ---
+# WEBHOOK_URL — публічна адреса бота; якщо не задана, setWebhook не викликається
+# (зручно для локального запуску разом з FAKE_TELEGRAM_API=1).
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '').rstrip('/')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET') or None
+WEBAPP_HOST = os.getenv('WEBAPP_HOST', '0.0.0.0')
+WEBAPP_PORT = int(os.getenv('WEBAPP_PORT', '8080'))
+WEBHOOK_MAX_IN_FLIGHT = int(os.getenv('WEBHOOK_MAX_IN_FLIGHT', '100'))
+HEALTH_PATH = os.getenv('HEALTH_PATH', '/healthz')
+
+
+class LimitedRequestHandler(SimpleRequestHandler):
+    """SimpleRequestHandler з обмеженням кількості апдейтів в обробці.
+
+    Коли всі слоти зайняті, HTTP-запит від Telegram чекає на вільний слот —
+    Telegram сам притримує подальші апдейти, черга в пам'яті не росте.
+    """
+
+    def __init__(self, *args: Any, max_in_flight: int = WEBHOOK_MAX_IN_FLIGHT, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.max_in_flight = max_in_flight
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+
+    async def _acquire(self) -> None:
+        await self._slots.acquire()
+        self.in_flight += 1
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        self._slots.release()
+
+    async def _feed_and_release(self, bot: Bot, update: Dict[str, Any]) -> None:
+        try:
+            await self._background_feed_update(bot=bot, update=update)
+        finally:
+            self._release()
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        await self._acquire()
+        try:
+            update = await request.json(loads=bot.session.json_loads)
+        except Exception:
+            self._release()
+            raise
+        task = asyncio.create_task(self._feed_and_release(bot, update))
+        self._background_feed_update_tasks.add(task)
+        task.add_done_callback(self._background_feed_update_tasks.discard)
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def _handle_request(self, bot: Bot, request: web.Request) -> web.Response:
+        await self._acquire()
+        try:
+            return await super()._handle_request(bot=bot, request=request)
+        finally:
+            self._release()
+
+
+def build_webhook_app(dp: Dispatcher, bot: Bot, **data: Any) -> web.Application:
+    """aiohttp-застосунок з webhook-обробником, health- і metrics-ендпоінтами (без виклику setWebhook)."""
+    app = web.Application()
+    handler = LimitedRequestHandler(dispatcher=dp, bot=bot, secret_token=WEBHOOK_SECRET, **data)
+    handler.register(app, path=WEBHOOK_PATH)
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({'status': 'ok', 'in_flight': handler.in_flight,
+                                  'max_in_flight': handler.max_in_flight})
+
+    app.router.add_get(HEALTH_PATH, health)
+    app.router.add_get(METRICS_PATH, metrics_handler)
+    setup_application(app, dp, bot=bot, **data)
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, **data: Any) -> None:
+    app = build_webhook_app(dp, bot, **data)
+    if WEBHOOK_URL:
+        await bot.set_webhook(f'{WEBHOOK_URL}{WEBHOOK_PATH}', secret_token=WEBHOOK_SECRET,
+                              allowed_updates=dp.resolve_used_update_types())
+        logger.info("Webhook set to %s%s", WEBHOOK_URL, WEBHOOK_PATH)
+    else:
+        logger.warning("WEBHOOK_URL is not set: serving %s without calling setWebhook", WEBHOOK_PATH)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBAPP_HOST, WEBAPP_PORT)
+    await site.start()
+    logger.info("Webhook server listening on %s:%s", WEBAPP_HOST, WEBAPP_PORT)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()